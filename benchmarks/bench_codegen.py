@@ -0,0 +1,291 @@
+"""Code generation and bus transaction regression suite of the halcpp C++ layer
+
+Exports a synthetic design, in hierarchical and flat address mode, and compiles a
+program with one function per representative operation (field, register, array
+and memory accesses), with each compiler and optimization level:
+  * compile_s - wall time of the fastest compilation of the program
+  * text      - size of the .text section of the object file
+  * insns     - instructions of each operation, the function and the functions it calls
+  * reads, writes, bytes - bus transactions of each operation, recorded by running the
+                program on the host with halcpp::TraceIoNode as the IO backend
+
+With --check BASELINE, exits with an error if an operation needs more bus transactions
+than in the baseline, or if its instructions or the .text size grew. Instructions and
+sizes are only compared for the compilers of the same version as in the baseline.
+--update BASELINE writes the results as the new baseline.
+
+Usage:
+    python benchmarks/bench_codegen.py [--cxx g++ clang++] [-O 0 s 2] [--check codegen_baseline.json]
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from systemrdl import RDLCompiler
+
+from peakrdl_halcpp.__about__ import __version__
+from peakrdl_halcpp.exporter import HalExporter
+
+BASELINE = os.path.join(os.path.dirname(__file__), "codegen_baseline.json")
+
+DESIGN_RDL = """\
+addrmap blk {
+    reg {
+        field { sw = rw; } EN[0:0] = 0;
+        field { sw = rw; } MODE[2:1] = 0;
+        field { sw = r; hw = w; } BUSY[3:3];
+        field { sw = rw; } DIV[15:8] = 0;
+    } CTRL @ 0x0;
+    reg { field { sw = w; } GO[0:0] = 0; field { sw = w; } ARG[15:8] = 0; } CMD @ 0x4;
+    reg {
+        field { sw = rw; onwrite = woclr; } IRQ0[0:0] = 0;
+        field { sw = rw; onwrite = woclr; } IRQ1[1:1] = 0;
+        field { sw = rw; } MSK[8:8] = 0;
+    } ISR @ 0x8;
+    reg { regwidth = 16; field { sw = rw; } V[15:0] = 0; } H16 @ 0xC;
+    reg { regwidth = 64; field { sw = rw; } V[63:0] = 0; } R64 @ 0x10;
+    reg { field { sw = rw; } ADDR[31:0] = 0; } DESC[256] @ 0x100;
+};
+addrmap ram { external mem { mementries = 256; memwidth = 32; } MEM @ 0x0; };
+addrmap bus { blk BLK @ 0x0; ram RAM @ 0x1000; };
+addrmap top { bus BUS @ 0x40000000; };
+"""
+
+# Body of each operation, R(path) is the type of a node below the top addrmap, accessing
+# the nodes through their type does not odr-use the static members, so -O0 programs link
+OPS = {
+    'field_write'    : "R(BUS.BLK.CTRL.EN)::set(v); return 0;",
+    'field_read'     : "return R(BUS.BLK.CTRL.MODE)::get();",
+    'field_write_wo' : "R(BUS.BLK.CMD.GO)::set(v); return 0;",
+    'reg_write'      : "R(BUS.BLK.CTRL)::set(v); return 0;",
+    'reg_read'       : "return R(BUS.BLK.CTRL)::get();",
+    'modify'         : "R(BUS.BLK.CTRL)::modify(R(BUS.BLK.CTRL.EN){}(v), R(BUS.BLK.CTRL.MODE){}(2)); return 0;",
+    'read_fields'    : "auto r = R(BUS.BLK.CTRL)::read(); return r.EN() + r.MODE();",
+    'w1c_clear'      : "R(BUS.BLK.ISR.IRQ0)::clear(); return 0;",
+    'reg16_write'    : "R(BUS.BLK.H16)::set(v); return 0;",
+    'reg64_write'    : "R(BUS.BLK.R64)::set(v); return 0;",
+    'array_const'    : "R(BUS.BLK.DESC){}.at<3>() = v; return 0;",
+    'array_runtime'  : "R(BUS.BLK.DESC){}[v & 255] = v; return 0;",
+    'array_fill'     : "for (uint32_t i = 0; i < 256; i++) R(BUS.BLK.DESC){}[i] = v; return 0;",
+    'mem_write'      : "R(BUS.RAM.MEM){}[v & 255] = v; return 0;",
+    'mem_read_block' : "uint32_t buf[16]; R(BUS.RAM.MEM)::read_block(0, buf, 16); return buf[0] + buf[15];",
+}
+
+PROGRAM = """\
+#include <cstdio>
+#include "top_hal.h"
+#ifdef TRACE_IO
+#include "include/host_io.h"
+using TRACE = halcpp::TraceIoNode<halcpp::SparseIoNode<>>;
+using TOP = TOP_HAL<0x0, void, TRACE>;
+#else
+using TOP = TOP_HAL<0x0>;
+#endif
+
+#define R(path) decltype(TOP().path)
+
+{functions}
+
+#ifdef TRACE_IO
+int main() {{
+{calls}
+    return 0;
+}}
+#endif
+"""
+
+
+def generate_program() -> str:
+    functions = []
+    calls = []
+    for name, body in OPS.items():
+        functions.append(f'extern "C" __attribute__((noinline)) uint64_t op_{name}(uint64_t v) {{ {body} }}')
+        calls.append(f'    TRACE::clear(); op_{name}(1);\n'
+                     f'    {{ uint32_t bytes = 0; for (auto &t : TRACE::transactions()) bytes += t.size;\n'
+                     f'      printf("{name} %u %u %u\\n", TRACE::reads(), TRACE::writes(), bytes); }}')
+    return PROGRAM.format(functions="\n".join(functions), calls="\n".join(calls))
+
+
+def compiler_version(cxx: str) -> str:
+    out = subprocess.run([cxx, "--version"], check=True, capture_output=True, text=True).stdout
+    return out.splitlines()[0]
+
+
+def text_size(obj: str) -> int:
+    out = subprocess.run(["size", "-A", obj], check=True, capture_output=True, text=True).stdout
+    return sum(int(line.split()[1]) for line in out.splitlines() if line.startswith(".text"))
+
+
+def count_insns(obj: str) -> 'dict[str, int]':
+    """Instructions of each op_ function, including the functions of the object it calls"""
+    # In an object file, the calls to functions of other sections are only visible as relocations
+    out = subprocess.run(["objdump", "-dr", "--no-show-raw-insn", obj], check=True, capture_output=True, text=True).stdout
+    insns = {}
+    calls = {}
+    func = None
+    for line in out.splitlines():
+        m = re.match(r"^[0-9a-f]+ <(.+)>:$", line)
+        if m:
+            func = m.group(1)
+            insns[func] = 0
+            calls[func] = set()
+        elif func is None:
+            continue
+        elif re.match(r"^\s+[0-9a-f]+:\s+R_\w+\s", line):
+            calls[func].add(re.split(r"[-+]0x", line.split()[-1])[0])
+        elif re.match(r"^\s+[0-9a-f]+:\s", line):
+            insns[func] += 1
+            m = re.search(r"\b(?:call|jmp)\w*\s+[0-9a-f]+ <([^>+]+)>", line)
+            if m:
+                calls[func].add(m.group(1))
+
+    result = {}
+    for name in OPS:
+        seen = set()
+        stack = [f"op_{name}"]
+        while stack:
+            f = stack.pop()
+            if f in seen or f not in insns:
+                continue
+            seen.add(f)
+            stack.extend(calls[f])
+        result[name] = sum(insns[f] for f in seen)
+    return result
+
+
+def run_build(args, outdir: str, cxx: str, opt: str) -> dict:
+    src = os.path.join(outdir, "ops.cpp")
+    obj = os.path.join(outdir, f"ops_{cxx}_O{opt}.o")
+    cmd = [cxx, "-std=c++17", f"-O{opt}", "-w", "-I", outdir, "-c", src, "-o", obj]
+    compile_s = float('inf')
+    for _ in range(args.compile_repeat):
+        start = time.perf_counter()
+        subprocess.run(cmd, check=True)
+        compile_s = min(compile_s, time.perf_counter() - start)
+
+    exe = os.path.join(outdir, f"trace_{cxx}_O{opt}")
+    subprocess.run([cxx, "-std=c++17", f"-O{opt}", "-w", "-DTRACE_IO", "-I", outdir, src, "-o", exe], check=True)
+    out = subprocess.run([exe], check=True, capture_output=True, text=True).stdout
+
+    insns = count_insns(obj)
+    ops = {}
+    for line in out.splitlines():
+        name, reads, writes, nbytes = line.split()
+        ops[name] = {'insns': insns[name], 'reads': int(reads), 'writes': int(writes), 'bytes': int(nbytes)}
+    return {
+        'compile_s' : compile_s,
+        'text'      : text_size(obj),
+        'ops'       : ops,
+        }
+
+
+def check(results: dict, compilers: 'dict[str, str]', baseline: dict, tolerance: float) -> 'list[str]':
+    """Return the regressions of results against the baseline"""
+    errors = []
+    for mode, by_cxx in baseline['results'].items():
+        for cxx, by_opt in by_cxx.items():
+            if cxx not in results.get(mode, {}):
+                continue
+            same_compiler = baseline['compilers'].get(cxx) == compilers[cxx]
+            for opt, base in by_opt.items():
+                cur = results[mode][cxx].get(opt)
+                if cur is None:
+                    continue
+                key = f"{mode} {cxx} {opt}"
+                if same_compiler and cur['text'] > base['text'] * (1 + tolerance):
+                    errors.append(f"{key}: .text {base['text']} -> {cur['text']}")
+                for name, b in base['ops'].items():
+                    c = cur['ops'].get(name)
+                    if c is None:
+                        errors.append(f"{key} {name}: operation missing")
+                        continue
+                    for metric in ('reads', 'writes', 'bytes'):
+                        if c[metric] > b[metric]:
+                            errors.append(f"{key} {name}: {metric} {b[metric]} -> {c[metric]}")
+                    if same_compiler and c['insns'] > b['insns'] * (1 + tolerance):
+                        errors.append(f"{key} {name}: insns {b['insns']} -> {c['insns']}")
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cxx", nargs='+', default=["g++", "clang++"], help="C++ compilers, the ones not installed are skipped")
+    parser.add_argument("-O", "--opt", nargs='+', default=["0", "s", "2"], help="Optimization levels")
+    parser.add_argument("-r", "--compile-repeat", dest="compile_repeat", type=int, default=3, help="Compilations of each program, the fastest is kept")
+    parser.add_argument("--check", metavar="BASELINE", nargs='?', const=BASELINE, help="Fail on regressions against BASELINE, %(const)s by default")
+    parser.add_argument("--update", metavar="BASELINE", nargs='?', const=BASELINE, help="Write the results to BASELINE, %(const)s by default")
+    parser.add_argument("--tolerance", type=float, default=0.0, help="Allowed relative growth of instructions and .text with --check")
+    parser.add_argument("-o", "--output", help="JSON output file, stdout by default")
+    args = parser.parse_args()
+
+    compilers = {cxx: compiler_version(cxx) for cxx in args.cxx if shutil.which(cxx)}
+    for cxx in args.cxx:
+        if cxx not in compilers:
+            print(f"{cxx} not found, skipped", file=sys.stderr)
+    if not compilers:
+        sys.exit("No C++ compiler found")
+
+    workdir = tempfile.mkdtemp()
+    try:
+        rdl_file = os.path.join(workdir, "design.rdl")
+        with open(rdl_file, 'w') as f:
+            f.write(DESIGN_RDL)
+        rdlc = RDLCompiler()
+        rdlc.compile_file(rdl_file)
+        node = rdlc.elaborate().top
+
+        results = {}
+        for flat in (False, True):
+            mode = "flat" if flat else "hierarchical"
+            outdir = os.path.join(workdir, mode)
+            HalExporter().export(node, outdir, keep_buses=True, deterministic=True, flat_addresses=flat)
+            with open(os.path.join(outdir, "ops.cpp"), 'w') as f:
+                f.write(generate_program())
+            results[mode] = {}
+            for cxx in compilers:
+                results[mode][cxx] = {}
+                for opt in args.opt:
+                    results[mode][cxx][f"O{opt}"] = run_build(args, outdir, cxx, opt)
+                    print(f"{mode} {cxx} -O{opt}: .text {results[mode][cxx][f'O{opt}']['text']}", file=sys.stderr)
+    finally:
+        shutil.rmtree(workdir)
+
+    report = {
+        'peakrdl_halcpp' : __version__,
+        'python'         : platform.python_version(),
+        'platform'       : platform.platform(),
+        'compilers'      : compilers,
+        'results'        : results,
+        }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    elif not args.check and not args.update:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.update:
+        with open(args.update, 'w') as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+
+    if args.check:
+        with open(args.check) as f:
+            baseline = json.load(f)
+        errors = check(results, compilers, baseline, args.tolerance)
+        for e in errors:
+            print(f"REGRESSION {e}", file=sys.stderr)
+        if errors:
+            sys.exit(1)
+        print("No regression", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
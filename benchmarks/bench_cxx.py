@@ -0,0 +1,157 @@
+"""C++ compile time, code size and access time of the generated HAL
+
+Exports a generated design (see bench_export.py) with its buses kept, once with the
+default hierarchical accesses and once with --flat-addresses, and compiles a test
+program that reads and writes every register, for each optimization level:
+  * compile_s - wall time of the fastest compilation
+  * text      - size of the .text section of the object file
+  * ns_access - time of a register access of the program, run on the host
+
+On the host the registers are backed by an array, the HostIo backend of the test
+program, passed as the IO_TYPE of the top addrmap.
+
+Usage:
+    python benchmarks/bench_cxx.py --addrmaps 20 --regs 16 --depth 4 [-O 0 2] [-o results.json]
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from systemrdl import RDLCompiler
+
+from peakrdl_halcpp.__about__ import __version__
+from peakrdl_halcpp.exporter import HalExporter
+
+from bench_export import generate_rdl
+
+MAIN = """\
+#include <chrono>
+#include <cstdio>
+#include "top_hal.h"
+
+inline uint32_t host_mem[1 << 20];
+
+class HostIo {{
+public:
+    template <typename T>
+    static inline T read(uint32_t addr) {{ return host_mem[(addr >> 2) & ((1 << 20) - 1)]; }}
+    template <typename T>
+    static inline void write(uint32_t addr, T val) {{ host_mem[(addr >> 2) & ((1 << 20) - 1)] = val; }}
+}};
+
+using TOP = TOP_HAL<0x0, void, HostIo>;
+
+__attribute__((noinline)) uint32_t access_all(uint32_t sink) {{
+    TOP top;
+{accesses}
+    return sink;
+}}
+
+int main(int argc, char **argv) {{
+    uint32_t sink = argc;
+    const int repeat = {repeat};
+    auto start = std::chrono::steady_clock::now();
+    for (int i = 0; i < repeat; i++)
+        sink = access_all(sink);
+    auto ns = std::chrono::duration<double, std::nano>(std::chrono::steady_clock::now() - start).count();
+    printf("%f\\n", ns / ((double)repeat * {count}));
+    return sink == 0x12345678;
+}}
+"""
+
+
+def generate_main(addrmaps: int, regs: int, depth: int, repeat: int) -> str:
+    # Accessing the registers through their type does not odr-use the static members,
+    # so the program also links without optimizations
+    path = "top." + "".join(f"BUS{d}." for d in reversed(range(depth)))
+    accesses = []
+    for a in range(addrmaps):
+        for r in range(regs):
+            accesses.append(f"    {{ using R = decltype({path}BLK{a}.REG{r}); sink += R::get(); R::set(sink); }}")
+    return MAIN.format(accesses="\n".join(accesses), repeat=repeat, count=addrmaps * regs * 2)
+
+
+def text_size(obj: str) -> int:
+    out = subprocess.run(["size", "-A", obj], check=True, capture_output=True, text=True).stdout
+    return sum(int(line.split()[1]) for line in out.splitlines() if line.startswith(".text"))
+
+
+def run(args, node, workdir: str, flat: bool) -> dict:
+    outdir = os.path.join(workdir, "flat" if flat else "hier")
+    HalExporter().export(node, outdir, keep_buses=True, deterministic=True, flat_addresses=flat)
+    with open(os.path.join(outdir, "main.cpp"), 'w') as f:
+        f.write(generate_main(args.addrmaps, args.regs, args.depth, args.repeat))
+
+    results = {}
+    for opt in args.opt:
+        obj = os.path.join(outdir, f"main_O{opt}.o")
+        exe = os.path.join(outdir, f"main_O{opt}")
+        cmd = [args.cxx, "-std=c++17", f"-O{opt}", "-I", outdir, "-c", os.path.join(outdir, "main.cpp"), "-o", obj]
+        compile_s = float('inf')
+        for _ in range(args.compile_repeat):
+            start = time.perf_counter()
+            subprocess.run(cmd, check=True)
+            compile_s = min(compile_s, time.perf_counter() - start)
+        subprocess.run([args.cxx, obj, "-o", exe], check=True)
+        ns_access = float(subprocess.run([exe], capture_output=True, text=True).stdout)
+        results[f"O{opt}"] = {
+            'compile_s' : compile_s,
+            'text'      : text_size(obj),
+            'ns_access' : ns_access,
+            }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--addrmaps", type=int, default=20, help="Number of addrmap types")
+    parser.add_argument("--regs", type=int, default=16, help="Registers per addrmap")
+    parser.add_argument("--fields", type=int, default=4, help="Fields per register")
+    parser.add_argument("--depth", type=int, default=4, help="Bus levels above the addrmaps")
+    parser.add_argument("-O", "--opt", nargs='+', default=["0", "2"], help="Optimization levels")
+    parser.add_argument("--cxx", default=os.environ.get("CXX", "g++"), help="C++ compiler")
+    parser.add_argument("-r", "--compile-repeat", dest="compile_repeat", type=int, default=3, help="Compilations of each program, the fastest is kept")
+    parser.add_argument("-n", "--repeat", type=int, default=1000, help="Calls of the access function of the test program")
+    parser.add_argument("-o", "--output", help="JSON output file, stdout by default")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    try:
+        rdl_file = os.path.join(workdir, "design.rdl")
+        with open(rdl_file, 'w') as f:
+            f.write(generate_rdl(args.addrmaps, args.regs, args.fields, 0, 0, args.depth))
+        rdlc = RDLCompiler()
+        rdlc.compile_file(rdl_file)
+        node = rdlc.elaborate().top
+
+        results = {}
+        for flat in (False, True):
+            mode = "flat" if flat else "hierarchical"
+            results[mode] = run(args, node, workdir, flat)
+            print(f"{mode}: {results[mode]}", file=sys.stderr)
+    finally:
+        shutil.rmtree(workdir)
+
+    report = {
+        'peakrdl_halcpp' : __version__,
+        'python'         : platform.python_version(),
+        'platform'       : platform.platform(),
+        'params'         : {p: getattr(args, p) for p in ('addrmaps', 'regs', 'fields', 'depth', 'cxx')},
+        'results'        : results,
+        }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
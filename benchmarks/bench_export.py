@@ -0,0 +1,173 @@
+"""Exporter pipeline benchmark on generated SystemRDL designs
+
+Generates parametric designs and times each phase of the export separately:
+  * elaborate         - RDL compilation and elaboration
+  * build_hierarchy   - creation of the HalAddrmap tree (buses kept)
+  * remove_buses      - HalAddrmap.remove_buses()
+  * render            - rendering of the addrmap headers to their temporary files
+  * write             - replacing the addrmap headers with their temporary files
+  * render_enums      - rendering of halcpp_enums.h, with --enums
+  * write_enums       - replacing halcpp_enums.h, with --enums
+  * copy_base_headers - copy of the base headers
+
+The phases after elaborate are the ones HalExporter.export() records in its profiler,
+they include the tracemalloc overhead of the profiler, the same as with --profile.
+
+Every design parameter accepts several values, all their combinations are run.
+Results are written as JSON, to stdout or to the file given with -o.
+
+Usage:
+    python benchmarks/bench_export.py --addrmaps 10 100 --regs 32 [-o results.json]
+"""
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+from systemrdl import RDLCompiler
+
+from peakrdl_halcpp.__about__ import __version__
+from peakrdl_halcpp.exporter import HalExporter
+from peakrdl_halcpp.halprofile import HalProfiler
+
+PARAMS = ('addrmaps', 'regs', 'fields', 'array_dim', 'enums', 'depth')
+
+
+def generate_rdl(addrmaps: int, regs: int, fields: int, array_dim: int, enums: int, depth: int) -> str:
+    """Return the SystemRDL source of a synthetic design
+
+    addrmaps  - number of distinct addrmap types, each instantiated once
+    regs      - registers per addrmap
+    fields    - fields per register, at most 32
+    array_dim - size of a register array added to each addrmap, 0 for none
+    enums     - number of enum types, used by the fields in turn
+    depth     - number of bus levels (addrmaps with only addrmaps) above the addrmaps
+    """
+    assert 1 <= fields <= 32, "Fields per register must be between 1 and 32"
+    field_width = 32 // fields
+    lines = []
+
+    for e in range(enums):
+        lines.append(f"enum enum{e}_e {{")
+        lines.extend(f"    VAL{v} = {v} {{ desc = \"Value {v}\"; }};" for v in range(4))
+        lines.append("};")
+
+    for a in range(addrmaps):
+        lines.append(f"addrmap blk{a} {{")
+        lines.append(f"    desc = \"Block {a}\";")
+        for r in range(regs):
+            lines.append(f"    reg {{")
+            for f in range(fields):
+                encode = f" encode = enum{(r * fields + f) % enums}_e;" if enums and field_width >= 2 else ""
+                lines.append(f"        field {{ sw = rw;{encode} }} F{f}[{(f + 1) * field_width - 1}:{f * field_width}] = 0;")
+            lines.append(f"    }} REG{r};")
+        if array_dim:
+            lines.append(f"    reg {{ field {{ sw = rw; }} V[31:0] = 0; }} ARR[{array_dim}];")
+        lines.append("};")
+
+    children = [f"    blk{a} BLK{a};" for a in range(addrmaps)]
+    for d in range(depth):
+        lines.append(f"addrmap bus{d} {{")
+        lines.extend(children)
+        lines.append("};")
+        children = [f"    bus{d} BUS{d};"]
+
+    lines.append("addrmap top {")
+    lines.extend(children)
+    lines.append("    reg { field { sw = r; hw = w; } ID[31:0]; } CHIPID;")
+    lines.append("};")
+    return "\n".join(lines) + "\n"
+
+
+def timed(func):
+    start = time.perf_counter()
+    res = func()
+    return res, time.perf_counter() - start
+
+
+def run(params: dict, workdir: str) -> dict:
+    rdl_file = os.path.join(workdir, "design.rdl")
+    with open(rdl_file, 'w') as f:
+        f.write(generate_rdl(**params))
+
+    def elaborate():
+        rdlc = RDLCompiler()
+        rdlc.compile_file(rdl_file)
+        return rdlc.elaborate().top
+
+    phases = {}
+    node, phases['elaborate'] = timed(elaborate)
+
+    outdir = os.path.join(workdir, "out")
+    profiler = HalProfiler(enabled=True)
+    with contextlib.redirect_stderr(io.StringIO()): # The profile report of the export
+        HalExporter().export(node, outdir, deterministic=True, profile=profiler)
+    for phase, (_, total, _) in profiler.get_phase_totals().items():
+        if phase != "export":
+            phases[phase] = total
+
+    # The rendered headers, the base headers are in include/
+    headers = [os.path.join(outdir, f) for f in os.listdir(outdir) if f.endswith(".h")]
+    return {
+        'params'  : params,
+        'phases'  : phases,
+        'total'   : sum(phases.values()),
+        'counts'  : {
+            'headers'     : sum(1 for phase, _, _, _ in profiler.records if phase.startswith("render")),
+            'regs'        : params['addrmaps'] * (params['regs'] + (1 if params['array_dim'] else 0)) + 1,
+            'output_bytes': sum(os.path.getsize(f) for f in headers),
+            },
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--addrmaps", type=int, nargs='+', default=[10], help="Number of addrmap types")
+    parser.add_argument("--regs", type=int, nargs='+', default=[32], help="Registers per addrmap")
+    parser.add_argument("--fields", type=int, nargs='+', default=[4], help="Fields per register")
+    parser.add_argument("--array-dim", dest="array_dim", type=int, nargs='+', default=[0], help="Register array size per addrmap")
+    parser.add_argument("--enums", type=int, nargs='+', default=[0], help="Number of enum types")
+    parser.add_argument("--depth", type=int, nargs='+', default=[1], help="Bus levels above the addrmaps")
+    parser.add_argument("-n", "--repeat", type=int, default=1, help="Runs per design, the fastest time of each phase is kept")
+    parser.add_argument("-o", "--output", help="JSON output file, stdout by default")
+    args = parser.parse_args()
+
+    results = []
+    for values in itertools.product(*(getattr(args, p) for p in PARAMS)):
+        params = dict(zip(PARAMS, values))
+        runs = []
+        for _ in range(args.repeat):
+            workdir = tempfile.mkdtemp()
+            try:
+                runs.append(run(params, workdir))
+            finally:
+                shutil.rmtree(workdir)
+        result = runs[0]
+        result['phases'] = {p: min(r['phases'][p] for r in runs) for p in result['phases']}
+        result['total'] = sum(result['phases'].values())
+        results.append(result)
+        print(f"{params} total {result['total']:.3f} s", file=sys.stderr)
+
+    report = {
+        'peakrdl_halcpp' : __version__,
+        'python'         : platform.python_version(),
+        'platform'       : platform.platform(),
+        'results'        : results,
+        }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Startup cost of the peakrdl plugin module
+
+peakrdl imports the module of every installed exporter plugin to build its command line,
+for every run, also to print --help or to run another exporter. This measures, each in a
+fresh interpreter:
+  * plugin        - import of peakrdl_halcpp.__peakrdl__ and creation of its argument parser,
+                    after the modules peakrdl itself imports to load plugins
+  * plugin_cold   - the same, without importing the peakrdl modules first
+  * export_import - import of the exporter, that do_export() imports when it runs
+
+The fastest of the runs is kept, times are in milliseconds. The modules the exporter depends
+on, that the plugin must not import, are listed in deferred_loaded if the plugin imports them.
+
+Usage:
+    python benchmarks/bench_import.py [-n 20] [--check] [-o results.json]
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+
+# Imported by peakrdl before the plugins, not part of the cost of the plugin
+PEAKRDL_MODULES = ["peakrdl.plugins.exporter", "peakrdl.config.schema"]
+
+# Dependencies of the export, that are only imported by do_export()
+DEFERRED_MODULES = [
+    "jinja2",
+    "getpass",
+    "peakrdl_halcpp.exporter",
+    "peakrdl_halcpp.haladdrmap",
+    "peakrdl_halcpp.halutils",
+    "peakrdl_halcpp.haltemplates",
+    "peakrdl_halcpp.halregmap",
+    "peakrdl_halcpp.halprofile",
+]
+
+PROGRAM = """
+import argparse, json, sys, time
+for m in {preload!r}:
+    __import__(m)
+start = time.perf_counter()
+{stmt}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"ms": elapsed * 1e3, "loaded": [m for m in {deferred!r} if m in sys.modules]}}))
+"""
+
+STMTS = {
+    "plugin": (PEAKRDL_MODULES, "from peakrdl_halcpp.__peakrdl__ import Exporter\n"
+                                "Exporter().add_exporter_arguments(argparse.ArgumentParser())"),
+    "plugin_cold": ([], "from peakrdl_halcpp.__peakrdl__ import Exporter\n"
+                        "Exporter().add_exporter_arguments(argparse.ArgumentParser())"),
+    "export_import": (PEAKRDL_MODULES + ["peakrdl_halcpp.__peakrdl__"], "from peakrdl_halcpp.exporter import HalExporter"),
+}
+
+
+def run(preload, stmt, repeat):
+    """Fastest time of stmt in repeat fresh interpreters, and the deferred modules it imported"""
+    program = PROGRAM.format(preload=preload, stmt=stmt, deferred=DEFERRED_MODULES)
+    best, loaded = None, []
+    for _ in range(repeat):
+        res = json.loads(subprocess.run([sys.executable, "-c", program], check=True,
+                                        stdout=subprocess.PIPE, universal_newlines=True).stdout)
+        best = res["ms"] if best is None else min(best, res["ms"])
+        loaded = res["loaded"]
+    return best, loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--repeat", type=int, default=20, help="Fresh interpreters per measure, the fastest is kept")
+    parser.add_argument("--check", action="store_true", help="Fail if the plugin imports one of the dependencies of the export")
+    parser.add_argument("-o", "--output", help="JSON output file, stdout by default")
+    args = parser.parse_args()
+
+    results = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+    }
+    for name, (preload, stmt) in STMTS.items():
+        ms, loaded = run(preload, stmt, args.repeat)
+        results[name] = round(ms, 2)
+        if name == "plugin":
+            results["deferred_loaded"] = loaded
+        print(f"{name}: {ms:.2f} ms", file=sys.stderr)
+
+    out = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(out + "\n")
+    else:
+        print(out)
+
+    if args.check and results["deferred_loaded"]:
+        print("The plugin imports " + ", ".join(results["deferred_loaded"]), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
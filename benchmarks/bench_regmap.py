@@ -0,0 +1,148 @@
+"""Address decoding with the register map of a generated design
+
+Exports a generated design (see bench_export.py) with --regmap and decodes random
+addresses, half of them mapped, with the RegMap of the binary register map:
+  * lookup_us - time of a single RegMap.lookup()
+  * decode_s  - time of RegMap.decode() over all the addresses
+  * paths_s   - time of RegMap.paths() over all the addresses
+
+--check also compares decode() and paths() with lookup() for the first 10000 addresses, and
+decodes with the register map of a design without registers, that maps no address.
+numpy must be installed.
+
+Usage:
+    python benchmarks/bench_regmap.py --addrmaps 100 --regs 32 [-n 1000000] [--check] [-o results.json]
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from typing import List
+
+import numpy as np
+from systemrdl import RDLCompiler
+
+from peakrdl_halcpp.__about__ import __version__
+from peakrdl_halcpp.exporter import HalExporter
+from peakrdl_halcpp.halregmap import RegMap, regmap_binary
+
+from bench_export import generate_rdl
+
+
+def export_regmap(params: dict, workdir: str) -> str:
+    rdl_file = os.path.join(workdir, "design.rdl")
+    with open(rdl_file, 'w') as f:
+        f.write(generate_rdl(**params))
+    rdlc = RDLCompiler()
+    rdlc.compile_file(rdl_file)
+    HalExporter().export(rdlc.elaborate().top, workdir, regmap=True)
+    return os.path.join(workdir, "top_regmap.bin")
+
+
+def random_addrs(rmap: RegMap, count: int, rng) -> 'np.ndarray':
+    """count addresses, half of them inside the entries and half anywhere below the last entry"""
+    bases = rmap._np_column(np, 'base')
+    ends = rmap._np_column(np, 'end')
+    entries = rng.integers(0, len(rmap), count // 2)
+    mapped = bases[entries] + (rng.random(count // 2) * (ends[entries] - bases[entries])).astype(np.uint64)
+    anywhere = rng.integers(0, int(ends.max()), count - count // 2, dtype=np.uint64)
+    return np.concatenate([mapped, anywhere])
+
+
+def check(rmap: RegMap, addrs) -> 'List[str]':
+    """Addresses that decode() or paths() do not decode like lookup()"""
+    entries, elements = rmap.decode(addrs)
+    paths = rmap.paths(addrs)
+    errors = []
+    for addr, entry, element, path in zip(addrs.tolist(), entries.tolist(), elements.tolist(), paths.tolist()):
+        reg = rmap.lookup(addr)
+        expected = (-1, None) if reg is None else (rmap.find(addr), reg.path)
+        if (entry, path) != expected or (reg is None and element != 0):
+            errors.append(f"0x{addr:x}: decode {entry} {path}, lookup {expected[0]} {expected[1]}")
+    return errors
+
+
+def check_empty(workdir: str) -> 'List[str]':
+    """A register map without entries maps no address"""
+    path = os.path.join(workdir, "empty_regmap.bin")
+    with open(path, 'wb') as f:
+        f.write(regmap_binary([]))
+    addrs = np.array([0, 4, 0xffffffff], dtype=np.uint64)
+    with RegMap(path) as rmap:
+        entries, elements = rmap.decode(addrs)
+        if (len(rmap) != 0 or any(rmap.lookup(int(a)) is not None for a in addrs)
+                or (entries != -1).any() or (elements != 0).any() or any(p is not None for p in rmap.paths(addrs))):
+            return ["Empty register map decodes mapped addresses"]
+    return []
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--addrmaps", type=int, default=100, help="Number of addrmap types")
+    parser.add_argument("--regs", type=int, default=32, help="Registers per addrmap")
+    parser.add_argument("--array-dim", dest="array_dim", type=int, default=8, help="Register array size per addrmap")
+    parser.add_argument("--depth", type=int, default=2, help="Bus levels above the addrmaps")
+    parser.add_argument("-n", "--addrs", type=int, default=1000000, help="Number of decoded addresses")
+    parser.add_argument("--check", action="store_true", help="Fail if decode() and paths() disagree with lookup()")
+    parser.add_argument("-o", "--output", help="JSON output file, stdout by default")
+    args = parser.parse_args()
+
+    params = {'addrmaps': args.addrmaps, 'regs': args.regs, 'fields': 4, 'array_dim': args.array_dim, 'enums': 0, 'depth': args.depth}
+    rng = np.random.default_rng(0)
+    workdir = tempfile.mkdtemp()
+    try:
+        errors = []
+        with RegMap(export_regmap(params, workdir)) as rmap:
+            addrs = random_addrs(rmap, args.addrs, rng)
+
+            sample = addrs[:10000].tolist()
+            start = time.perf_counter()
+            for addr in sample:
+                rmap.lookup(addr)
+            lookup_us = (time.perf_counter() - start) / len(sample) * 1e6
+
+            start = time.perf_counter()
+            rmap.decode(addrs)
+            decode_s = time.perf_counter() - start
+
+            start = time.perf_counter()
+            rmap.paths(addrs)
+            paths_s = time.perf_counter() - start
+
+            entries = len(rmap)
+            if args.check:
+                errors += check(rmap, addrs[:10000])
+        if args.check:
+            errors += check_empty(workdir)
+    finally:
+        shutil.rmtree(workdir)
+
+    results = {
+        'peakrdl_halcpp' : __version__,
+        'python'         : platform.python_version(),
+        'platform'       : platform.platform(),
+        'params'         : params,
+        'entries'        : entries,
+        'addrs'          : args.addrs,
+        'lookup_us'      : round(lookup_us, 3),
+        'decode_s'       : round(decode_s, 4),
+        'paths_s'        : round(paths_s, 4),
+        }
+    out = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(out + "\n")
+    else:
+        print(out)
+
+    if errors:
+        print("\n".join(errors[:20]), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
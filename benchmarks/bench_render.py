@@ -0,0 +1,67 @@
+"""Per-addrmap render cost of HalExporter templates
+
+Compares three ways of getting the addrmap template:
+  * fresh     - new Environment + FileSystemLoader for every render (old behaviour)
+  * shared    - one Environment per process, template parsed once
+  * compiled  - one Environment per process, template precompiled to a python module
+
+Usage:
+    python benchmarks/bench_render.py [RDL_FILES ...] [-n REPEAT]
+"""
+import argparse
+import os
+import tempfile
+import timeit
+
+import jinja2
+from systemrdl import RDLCompiler
+
+from peakrdl_halcpp.halutils import HalUtils
+from peakrdl_halcpp import haltemplates
+
+EXAMPLE_RDL = os.path.join(os.path.dirname(__file__), "..", "examples", "atxmega_spi.rdl")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("rdl_files", nargs="*", default=[EXAMPLE_RDL])
+    parser.add_argument("-n", "--repeat", type=int, default=200, help="Number of renders of each addrmap")
+    args = parser.parse_args()
+
+    rdlc = RDLCompiler()
+    for f in args.rdl_files:
+        rdlc.compile_file(f)
+    root = rdlc.elaborate()
+
+    halutils = HalUtils([])
+    top = halutils.build_hierarchy(root.top)
+    addrmaps = halutils.get_unique_type_nodes(top.get_addrmaps_recursive())
+
+    compiled_dir = tempfile.mkdtemp()
+    haltemplates.compile_templates(compiled_dir)
+
+    shared_env = haltemplates.create_environment(jinja2.FileSystemLoader(haltemplates.TEMPLATES_DIR))
+    compiled_env = haltemplates.create_environment(jinja2.ModuleLoader(compiled_dir))
+    modes = {
+        'fresh'    : lambda: haltemplates.create_environment(jinja2.FileSystemLoader(haltemplates.TEMPLATES_DIR)),
+        'shared'   : lambda: shared_env,
+        'compiled' : lambda: compiled_env,
+        }
+
+    print(f"{'addrmap':<32}" + "".join(f"{m + ' [us]':>16}" for m in modes))
+    totals = dict.fromkeys(modes, 0.0)
+    for halnode in addrmaps:
+        context = {'halnode' : halnode, 'halutils' : halutils}
+        row = f"{halnode.type_name:<32}"
+        for mode, get_env in modes.items():
+            t = timeit.timeit(lambda: get_env().get_template("addrmap.j2").render(context), number=args.repeat)
+            per_render = t / args.repeat * 1e6
+            totals[mode] += per_render
+            row += f"{per_render:>16.1f}"
+        print(row)
+
+    print(f"{'mean':<32}" + "".join(f"{totals[m] / len(addrmaps):>16.1f}" for m in modes))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,24 @@
 import os
+import importlib.util
 import setuptools
+from setuptools.command.build_py import build_py
+
+
+class BuildPyCompileTemplates(build_py):
+    """Ship the Jinja templates precompiled into python modules"""
+    def run(self):
+        super().run()
+        try:
+            import jinja2 # noqa: F401
+        except ImportError:
+            # Templates will be parsed at runtime instead
+            return
+        spec = importlib.util.spec_from_file_location(
+                "haltemplates", os.path.join("src/peakrdl_halcpp", "haltemplates.py"))
+        haltemplates = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(haltemplates)
+        target = os.path.join(self.build_lib, "peakrdl_halcpp", "templates", "compiled")
+        haltemplates.compile_templates(target)
 
 with open("README.md", "r", encoding='utf-8') as fh:
     long_description = fh.read()
@@ -22,11 +41,18 @@ setuptools.setup(
     package_dir={'': 'src'},
     packages=setuptools.find_packages("src"),
     include_package_data=True,
+    cmdclass={'build_py': BuildPyCompileTemplates},
     python_requires='>=3.6',
+    setup_requires=[
+        "Jinja2>=3.0.0",
+    ],
     install_requires=[
         "systemrdl-compiler>=1.25.0",
         "Jinja2>=3.0.0",
     ],
+    extras_require={
+        "numpy": ["numpy"], # RegMap.decode() and RegMap.paths()
+    },
     entry_points = {
         "peakrdl.exporters": [
             'halcpp = peakrdl_halcpp.__peakrdl__:Exporter'
@@ -1 +1,25 @@
-from .exporter import HalExporter
+import sys
+from typing import TYPE_CHECKING
+
+# Imported on first use, the peakrdl plugin module is imported with the package and must stay light
+_lazy = {
+    "HalExporter": ".exporter",
+    "RegMap": ".halregmap",
+}
+
+if TYPE_CHECKING or sys.version_info < (3, 7):
+    from .exporter import HalExporter
+    from .halregmap import RegMap
+else:
+    def __getattr__(name):
+        if name in _lazy:
+            import importlib
+            value = getattr(importlib.import_module(_lazy[name], __name__), name)
+            globals()[name] = value
+            return value
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    def __dir__():
+        return sorted(list(globals()) + list(_lazy))
+
+__all__ = ["HalExporter", "RegMap"]
@@ -3,13 +3,14 @@ from typing import TYPE_CHECKING
 from peakrdl.plugins.exporter import ExporterSubcommandPlugin #pylint: disable=import-error
 from peakrdl.config import schema #pylint: disable=import-error
 
-# from peakrdl.main import main
-from .exporter import  HalExporter
-import sys
-
+# The exporter, with jinja2 and the Hal nodes, is only imported by do_export(), peakrdl imports
+# every plugin to build its command line, also to run other exporters or print --help
 if TYPE_CHECKING:
     import argparse
+    from typing import List
     from systemrdl.node import AddrmapNode
+    from peakrdl.plugins.importer import ImporterPlugin
+    from .exporter import HalExporter
 
 
 class Exporter(ExporterSubcommandPlugin):
@@ -25,6 +26,26 @@ class Exporter(ExporterSubcommandPlugin):
                 help="list of addrmap modules that have implemented <name>_EXT class in <name>_ext.h header file, used for extending functionality"
                 )
 
+        arg_group.add_argument(
+                "--shadow",
+                nargs="*",
+                help="list of addrmap or register type names whose writable registers keep a RAM mirror of their value, field writes then only write the register"
+                )
+
+        arg_group.add_argument(
+                "--csr",
+                nargs="*",
+                metavar="ADDRMAP",
+                help="list of addrmap type names whose registers are RISC-V CSRs, accessed with the csrr, csrw, csrs and csrc instructions, the CSR number is the offset of the register divided by its size"
+                )
+
+        arg_group.add_argument(
+            "--tops",
+            nargs="+",
+            metavar="TOP",
+            help="Export these root addrmaps together instead of the one of --top, the headers of the addrmap types they share and the base headers are written once"
+        )
+
         arg_group.add_argument(
             "--list-files",
             dest="list_files",
@@ -41,17 +62,150 @@ class Exporter(ExporterSubcommandPlugin):
             help="If there is an addrmap containing only addrmaps, not registers, by default it will be ommited in hierarchy, it is possible to keep it by passing --keep-buses flag"
         )
 
+        arg_group.add_argument(
+            "--flat-addresses",
+            dest="flat_addresses",
+            default=False,
+            action="store_true",
+            help="Registers access the bus directly at their absolute address, computed at compile time, instead of through every parent addrmap, this reduces the template instantiations and the code of unoptimized builds. Accesses then bypass the get/set of <name>_EXT classes"
+        )
+
+        arg_group.add_argument(
+            "--deterministic",
+            dest="deterministic",
+            default=False,
+            action="store_true",
+            help="Do not stamp the user and generation time into the generated files, so the same input always gives byte-identical output and unchanged files are not rewritten"
+        )
 
-    def do_export(self, top_node: 'AddrmapNode', options: 'argparse.Namespace') -> None:
-        hal = HalExporter()
+        arg_group.add_argument(
+            "--manifest",
+            dest="manifest",
+            default=False,
+            action="store_true",
+            help="Write halcpp_manifest.json to the output directory with the hashes of the source RDL files and of the generated files"
+        )
+
+        arg_group.add_argument(
+            "--regmap",
+            dest="regmap",
+            default=False,
+            action="store_true",
+            help="Also write <top>_regmap.json and <top>_regmap.bin, a flat register map sorted by address, to decode bus addresses to register and field names"
+        )
+
+        arg_group.add_argument(
+            "--jobs",
+            dest="jobs",
+            type=int,
+            default=1,
+            metavar="N",
+            help="Render and write the addrmap headers with N parallel workers, output is identical to the serial export"
+        )
+
+        arg_group.add_argument(
+            "--watch",
+            dest="watch",
+            default=False,
+            action="store_true",
+            help="Keep running and export again whenever an input RDL file changes, only the addrmap headers whose content changed are rewritten"
+        )
+
+        arg_group.add_argument(
+            "--watch-interval",
+            dest="watch_interval",
+            type=float,
+            default=0.5,
+            metavar="SECONDS",
+            help="Interval between two checks of the input files with --watch"
+        )
+
+        arg_group.add_argument(
+            "--profile",
+            dest="profile",
+            default=False,
+            action="store_true",
+            help="Report the wall time and peak memory of each export phase and the slowest addrmaps to stderr, addrmaps are rendered serially"
+        )
+
+        arg_group.add_argument(
+            "--profile-top",
+            dest="profile_top",
+            type=int,
+            default=10,
+            metavar="N",
+            help="Number of slowest addrmaps listed by --profile"
+        )
+
+        arg_group.add_argument(
+            "--profile-dump",
+            dest="profile_dump",
+            default=None,
+            metavar="FILE",
+            help="With --profile, write cProfile statistics to FILE, or collapsed stacks of the export phases for flame graph tools if FILE ends with .folded"
+        )
+
+
+    def main(self, importers: 'List[ImporterPlugin]', options: 'argparse.Namespace') -> None:
+        if not options.watch:
+            if options.tops:
+                self.do_export(self.elaborate(importers, options), options)
+            else:
+                super().main(importers, options)
+            return
+
+        from .halwatch import HalWatcher
+        watcher = HalWatcher(
+                elaborate=lambda: self.elaborate(importers, options),
+                export=lambda hal, top_node: self.do_export(top_node, options, hal),
+                input_files=options.input_files,
+                interval=options.watch_interval,
+                )
+        watcher.run()
+
+    def elaborate(self, importers: 'List[ImporterPlugin]', options: 'argparse.Namespace') -> 'List[AddrmapNode]':
+        """Compile and elaborate the input files, same as ExporterSubcommand.main(), once for each of --tops"""
+        from systemrdl import RDLCompiler
+        from peakrdl import process_input #pylint: disable=import-error
+
+        rdlc = RDLCompiler()
+        for udp in self.udp_definitions:
+            rdlc.register_udp(udp)
+        parameters = process_input.parse_parameters(rdlc, options.parameters)
+        process_input.process_input(rdlc, importers, options.input_files, options)
+        if not options.tops:
+            root = rdlc.elaborate(
+                top_def_name=options.top_def_name,
+                inst_name=options.inst_name,
+                parameters=parameters
+            )
+            return [root.top]
+        if options.inst_name is not None:
+            rdlc.msg.fatal("--rename cannot be used with --tops")
+        return [rdlc.elaborate(top_def_name=top, parameters=parameters).top for top in options.tops]
+
+    def do_export(self, top_node: 'AddrmapNode|List[AddrmapNode]', options: 'argparse.Namespace', hal: 'HalExporter|None' = None) -> None:
+        from .exporter import HalExporter
+        from .halprofile import HalProfiler
+
+        if hal is None:
+            hal = HalExporter()
         hal.export(
             nodes=top_node,
             outdir=options.output,
             list_files=options.list_files,
             ext=options.ext,
+            shadow=options.shadow,
+            csr=options.csr,
             keep_buses=options.keep_buses,
+            flat_addresses=options.flat_addresses,
+            deterministic=options.deterministic,
+            manifest=options.manifest,
+            regmap=options.regmap,
+            jobs=options.jobs,
+            profile=HalProfiler(
+                enabled=options.profile,
+                top_n=options.profile_top,
+                dump_file=options.profile_dump,
+                ),
         )
-
-        # if "-DUSE_ZICSR=1" not in sys.argv:
-        #     sys.argv.append("-DUSE_ZICSR=1")
-        #     main()
@@ -1,41 +1,181 @@
 from systemrdl.node import  Node, RootNode, AddrmapNode
-import jinja2
-from typing import List, Union, Any
+from typing import List, Union, Any, Tuple, Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import multiprocessing
 import os
-import shutil
+import hashlib
+import json
 
 from .haladdrmap import *
 from .halutils import HalUtils
+from .haltemplates import get_environment
+from .halprofile import HalProfiler
+from .halregmap import build_regmap, regmap_json, regmap_binary
+from .__about__ import __version__
+
+# Set by HalExporter.render_addrmaps() before forking the worker processes,
+# the workers inherit the hierarchy instead of receiving it pickled
+_worker_state = None
+
+def _render_worker(idx : int) -> 'Tuple[str, str]':
+    exporter, halnodes, halutils, outdir = _worker_state
+    return exporter.render_addrmap(halnodes[idx], halutils, outdir)
 
 class HalExporter():
-    def __init__(self):
+    def __init__(self, incremental : bool=False):
+        """With incremental, the exporter remembers what each addrmap header was rendered from,
+        later exports with the same exporter only render the headers whose content changed"""
         self.cpp_dir = "include"
+        self.render_cache = {} if incremental else None # type: Dict[str, Tuple[str, str]]|None
+        self.rendered = [] # type: List[str] # Addrmap headers rendered by the last export
 
         self.base_headers = [
                 "halcpp_base.h",
                 "halcpp_utils.h",
                 "field_node.h",
                 "reg_node.h",
+                "csr_reg_node.h",
                 "regfile_node.h",
                 "array_nodes.h",
                 "addrmap_node.h",
                 "arch_io.h",
+                "host_io.h",
                 ]
 
+        self.manifest_file = "halcpp_manifest.json"
+        self.enums_file = "halcpp_enums.h"
+
     def list_files(self,
-                   top : HalAddrmap,
+                   tops : 'HalAddrmap|List[HalAddrmap]',
                    outdir : str,
+                   manifest : bool=False,
+                   regmap : bool=False,
                    ):
-        out_files = [os.path.join(outdir, addrmap.type_name + ".h") for addrmap in top.get_addrmaps_recursive()]
-        out_files += [os.path.join(outdir, x) for x in self.base_headers] + out_files
+        """Print the files exported for the tops, each file once"""
+        if not isinstance(tops, list):
+            tops = [tops]
+        addrmaps = (addrmap for top in tops for addrmap in top.iter_addrmaps_recursive())
+        out_files = list(dict.fromkeys(self.get_out_file(addrmap, outdir) for addrmap in addrmaps))
+        out_files += [os.path.join(outdir, "include", x) for x in self.base_headers]
+        if len(tops[-1].enum_registry) > 0:
+            out_files.append(os.path.join(outdir, self.enums_file))
+        if regmap:
+            out_files += list(dict.fromkeys(f for top in tops for f in self.get_regmap_files(top, outdir)))
+        if manifest:
+            out_files.append(os.path.join(outdir, self.manifest_file))
         print(*out_files) # Print files to stdout
 
-    def copy_base_headers(self, outdir):
+    def copy_base_headers(self, outdir) -> 'Dict[str, str]':
+        """Copy the base headers that changed, returns a dict of {out_file: sha256}"""
         abspaths = [os.path.join(os.path.dirname(__file__), self.cpp_dir, x) for x in self.base_headers]
         outdir = os.path.join(outdir, "include")
         if not os.path.exists(outdir):
             os.makedirs(outdir)
-        [shutil.copy(x, outdir) for x in abspaths]
+        hashes = {}
+        for x in abspaths:
+            with open(x, 'rb') as f:
+                out_file = os.path.join(outdir, os.path.basename(x))
+                hashes[out_file] = self.write_if_changed(out_file, f.read())
+        return hashes
+
+    @staticmethod
+    def file_hash(path: str) -> str:
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 16), b''):
+                h.update(chunk)
+        return h.hexdigest()
+
+    def write_if_changed(self, path: str, content: bytes) -> str:
+        """Write content to path unless the file already has the same content
+
+        Leaving unchanged files untouched keeps their timestamp, so make/ninja
+        only rebuild what depends on the files that actually changed.
+        Returns the sha256 of the content.
+        """
+        digest = hashlib.sha256(content).hexdigest()
+        if not (os.path.isfile(path) and self.file_hash(path) == digest):
+            with open(path, 'wb') as f:
+                f.write(content)
+        return digest
+
+    def stream_to_file(self, path: str, chunks: 'Iterable[str]') -> str:
+        """Write the chunks to path through a buffered writer, returns the content sha256"""
+        h = hashlib.sha256()
+
+        def flush(f, pending):
+            data = "".join(pending).encode('utf-8')
+            h.update(data)
+            f.write(data)
+
+        with open(path, 'wb') as f:
+            # Only remove the file this call created, a failed open() raises its own error
+            try:
+                # Template chunks are small, batch them to bound both the memory and the per chunk overhead
+                pending = []
+                size = 0
+                for chunk in chunks:
+                    pending.append(chunk)
+                    size += len(chunk)
+                    if size >= 1 << 16:
+                        flush(f, pending)
+                        pending = []
+                        size = 0
+                flush(f, pending)
+            except BaseException:
+                f.close()
+                os.remove(path)
+                raise
+        return h.hexdigest()
+
+    def replace_if_changed(self, tmp_path: str, path: str, digest: str):
+        """Move tmp_path to path, unless path already has the content of digest"""
+        if os.path.isfile(path) and self.file_hash(path) == digest:
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, path)
+
+    def get_regmap_files(self, top : HalAddrmap, outdir : str) -> 'List[str]':
+        name = os.path.join(outdir, top.orig_type_name + "_regmap")
+        return [name + ".json", name + ".bin"]
+
+    def write_regmap(self, top : HalAddrmap, outdir : str) -> 'Dict[str, str]':
+        """Write the flat register map of the hierarchy in JSON and binary, returns a dict of {out_file: sha256}"""
+        entries = build_regmap(top)
+        json_file, bin_file = self.get_regmap_files(top, outdir)
+        return {
+                json_file : self.write_if_changed(json_file, regmap_json(entries, "peakrdl-halcpp " + __version__).encode('utf-8')),
+                bin_file  : self.write_if_changed(bin_file, regmap_binary(entries)),
+                }
+
+    def get_source_files(self, node : AddrmapNode) -> 'List[str]':
+        """Return the RDL files that the node and its descendants were described in"""
+        sources = set()
+        for n in [node, *node.descendants()]:
+            for src_ref in (n.inst.def_src_ref, n.inst.inst_src_ref):
+                path = getattr(src_ref, 'path', None)
+                if path is not None:
+                    sources.add(path)
+        return sorted(sources)
+
+    def write_manifest(self,
+                       outdir : str,
+                       sources : 'List[str]',
+                       outputs : 'Dict[str, str]',
+                       ):
+        """Write a manifest of source and output file hashes
+
+        The manifest is rewritten on every export, so it can be used as a stamp
+        file by build systems, the generated headers only change when their content does.
+        """
+        manifest = {
+                'generator' : "peakrdl-halcpp " + __version__,
+                'sources'   : {src : self.file_hash(src) for src in sources if os.path.isfile(src)},
+                'outputs'   : {os.path.relpath(out, outdir).replace(os.sep, '/') : digest for out, digest in outputs.items()},
+                }
+        with open(os.path.join(outdir, self.manifest_file), 'w') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+            f.write("\n")
 
     def export(self,
             nodes: 'Union[Node, List[Node]]',
@@ -43,7 +183,32 @@ class HalExporter():
             list_files: bool=False,
             ext : list=[],
             keep_buses : bool=False,
+            deterministic : bool=False,
+            manifest : bool=False,
+            jobs : int=1,
+            profile : 'bool|HalProfiler'=False,
+            shadow : 'List[str]|None'=None,
+            flat_addresses : bool=False,
+            regmap : bool=False,
+            csr : 'List[str]|None'=None,
             **kwargs: 'Dict[str, Any]') -> None:
+        """Export the HAL headers of the top addrmaps to outdir
+
+        All the nodes are exported in one run, the header of an addrmap type shared by
+        several tops is rendered and written once, and the base headers are copied once.
+
+        profile can be True, or a HalProfiler to choose its options, to report
+        the time and memory of each export phase at the end of the export.
+        Addrmaps are then rendered serially, whatever the value of jobs.
+        shadow is a list of addrmap or register type names, whose writable registers
+        keep a RAM mirror of their value, so field writes do not read the register.
+        flat_addresses makes the registers access the IO of the top addrmap directly at
+        their absolute address, instead of through the get()/set() of every parent.
+        regmap writes <top>_regmap.json and <top>_regmap.bin, the flat register map of
+        the hierarchy, the binary one is read by halregmap.RegMap to decode addresses.
+        csr is a list of addrmap type names, whose registers are RISC-V CSRs accessed with
+        csrr, csrw, csrs and csrc, the CSR number being the offset of the register divided by its size.
+        """
 
 
         # if not a list
@@ -63,42 +228,187 @@ class HalExporter():
         except FileExistsError:
             pass
 
-        halutils = HalUtils(ext)
+        halutils = HalUtils(ext, deterministic=deterministic, shadow=shadow, flat_addresses=flat_addresses, csr=csr)
 
-        assert isinstance(nodes[-1], AddrmapNode)
-        top = halutils.build_hierarchy(
-                node=nodes[-1],
-                remove_root=False, # TODO fix
-                keep_buses=keep_buses,
-                )
+        profiler = profile if isinstance(profile, HalProfiler) else HalProfiler(enabled=profile)
+        profiler.start()
+        # A failed export stops tracemalloc and cProfile too, in watch mode the next export starts them again
+        try:
+            # The tops share the Hal nodes of the addrmap types they have in common, and a single enums header
+            type_cache = {}
+            enum_registry = HalEnumRegistry()
+            tops = []
+            with profiler.phase("build_hierarchy"):
+                for node in nodes:
+                    assert isinstance(node, AddrmapNode)
+                    tops.append(halutils.build_hierarchy(
+                            node=node,
+                            remove_root=False, # TODO fix
+                            keep_buses=True,
+                            type_cache=type_cache,
+                            enum_registry=enum_registry,
+                            ))
+            if keep_buses is False:
+                with profiler.phase("remove_buses"):
+                    for top in tops:
+                        top.remove_buses()
 
 
-        if list_files:
-            self.list_files(top, outdir)
-        else:
-            for halnode in top.get_addrmaps_recursive():
-                context = {
-                        'halnode'  : halnode,
-                        'halutils' : halutils,
-                        }
-                text = self.process_template(context)
-                out_file = os.path.join(outdir, halnode.type_name + ".h")
-                with open(out_file, 'w') as f:
-                    f.write(text)
-
-            self.copy_base_headers(outdir)
+            if list_files:
+                self.list_files(tops, outdir, manifest=manifest, regmap=regmap)
+            else:
+                addrmaps = (addrmap for top in tops for addrmap in top.iter_addrmaps_recursive())
+                outputs = self.render_addrmaps(addrmaps, halutils, outdir, jobs, profiler)
+                if len(enum_registry) > 0:
+                    outputs.update([self.render_enums(tops[-1], halutils, outdir, profiler)])
+                with profiler.phase("copy_base_headers"):
+                    outputs.update(self.copy_base_headers(outdir))
+                if regmap:
+                    with profiler.phase("regmap"):
+                        for top in tops:
+                            outputs.update(self.write_regmap(top, outdir))
 
-    def process_template(self, context : dict) -> str:
+                if manifest:
+                    with profiler.phase("manifest"):
+                        sources = sorted(set(src for node in nodes for src in self.get_source_files(node)))
+                        self.write_manifest(outdir, sources, outputs)
+        finally:
+            profiler.stop()
+        profiler.report()
+
+    def get_out_file(self, halnode : HalAddrmap, outdir : str) -> str:
+        return os.path.join(outdir, halnode.type_name + ".h")
+
+    def render_addrmap(self,
+                       halnode : HalAddrmap,
+                       halutils : HalUtils,
+                       outdir : str,
+                       profiler : 'HalProfiler|None' = None,
+                       ) -> 'Tuple[str, str]':
+        """Render and write the header of one addrmap, returns (out_file, sha256)"""
+        context = {
+                'halnode'    : halnode,
+                'halutils'   : halutils,
+                'enums'      : {}, # Enums already declared in this render, and their alias
+                'enums_file' : self.enums_file,
+                }
+        out_file = self.get_out_file(halnode, outdir)
+        return out_file, self.render_to_file("addrmap.j2", context, out_file, halnode.type_name, profiler)
+
+    def render_enums(self,
+                     top : HalAddrmap,
+                     halutils : HalUtils,
+                     outdir : str,
+                     profiler : 'HalProfiler|None' = None,
+                     ) -> 'Tuple[str, str]':
+        """Render and write the header with the enums shared by all addrmaps, returns (out_file, sha256)"""
+        context = {
+                'enum_registry' : top.enum_registry,
+                'halutils'      : halutils,
+                }
+        out_file = os.path.join(outdir, self.enums_file)
+        # Own phases, the profile ranks the addrmaps by their render and write phases
+        return out_file, self.render_to_file("enums.j2", context, out_file, "", profiler, phase_suffix="_enums")
+
+    def render_to_file(self,
+                       template : str,
+                       context : dict,
+                       out_file : str,
+                       name : str,
+                       profiler : 'HalProfiler|None' = None,
+                       phase_suffix : str = "",
+                       ) -> str:
+        """Render the template into out_file if its content changed, returns the content sha256
+
+        The time is profiled in the render and write phases, followed by phase_suffix.
+        """
+        if profiler is None:
+            profiler = HalProfiler(enabled=False)
+        tmp_file = out_file + ".tmp"
+        # Stream the template output to disk, memory does not grow with the header size
+        with profiler.phase("render" + phase_suffix, name):
+            digest = self.stream_to_file(tmp_file, self.generate_template(context, template))
+        with profiler.phase("write" + phase_suffix, name):
+            self.replace_if_changed(tmp_file, out_file, digest)
+        return digest
+
+    def render_addrmaps(self,
+                        halnodes : 'List[HalAddrmap]',
+                        halutils : HalUtils,
+                        outdir : str,
+                        jobs : int=1,
+                        profiler : 'HalProfiler|None' = None,
+                        ) -> 'Dict[str, str]':
+        """Render and write the addrmap headers, returns a dict of {out_file: sha256}
 
-        env = jinja2.Environment(
-            loader=jinja2.FileSystemLoader('%s/templates/' % os.path.dirname(__file__)),
-            trim_blocks=True,
-            lstrip_blocks=True)
+        Each output file is rendered once, from the last addrmap mapped to it, same as
+        when every addrmap was written in turn and overwrote the previous ones.
+        With jobs > 1 the addrmaps are rendered by a pool of forked processes, or
+        of threads on platforms that cannot fork.
+        With an incremental exporter, the headers rendered from the same addrmap content
+        and options as in the previous exports are not rendered again.
+        """
+        halnodes = list({self.get_out_file(n, outdir): n for n in halnodes}.values())
+        if profiler is None:
+            profiler = HalProfiler(enabled=False)
+        if self.render_cache is None:
+            outputs = self.render_addrmap_files(halnodes, halutils, outdir, jobs, profiler)
+            self.rendered = list(outputs)
+            return outputs
 
-        env.filters.update({
-            'zip' : zip,
-            })
+        outputs = {}
+        fingerprints = {}
+        changed = []
+        with profiler.phase("fingerprint"):
+            for n in halnodes:
+                out_file = self.get_out_file(n, outdir)
+                fingerprints[out_file] = n.fingerprint() + halutils.fingerprint()
+                cached = self.render_cache.get(out_file)
+                if cached is not None and cached[0] == fingerprints[out_file] and os.path.isfile(out_file):
+                    outputs[out_file] = cached[1]
+                else:
+                    changed.append(n)
+        rendered = self.render_addrmap_files(changed, halutils, outdir, jobs, profiler)
+        for out_file, digest in rendered.items():
+            self.render_cache[out_file] = (fingerprints[out_file], digest)
+        self.rendered = list(rendered)
+        outputs.update(rendered)
+        return outputs
+
+    def render_addrmap_files(self,
+                                halnodes : 'List[HalAddrmap]',
+                                halutils : HalUtils,
+                                outdir : str,
+                                jobs : int=1,
+                                profiler : 'HalProfiler|None' = None,
+                                ) -> 'Dict[str, str]':
+        """Render and write the headers of halnodes, each one mapped to a different file"""
+        if jobs <= 1 or len(halnodes) <= 1 or (profiler is not None and profiler.enabled):
+            return dict(self.render_addrmap(n, halutils, outdir, profiler) for n in halnodes)
+
+        if 'fork' in multiprocessing.get_all_start_methods():
+            global _worker_state
+            _worker_state = (self, halnodes, halutils, outdir)
+            try:
+                with ProcessPoolExecutor(jobs, mp_context=multiprocessing.get_context('fork')) as pool:
+                    chunksize = max(1, len(halnodes) // (jobs * 4))
+                    return dict(pool.map(_render_worker, range(len(halnodes)), chunksize=chunksize))
+            finally:
+                _worker_state = None
+
+        with ThreadPoolExecutor(jobs) as pool:
+            return dict(pool.map(lambda n: self.render_addrmap(n, halutils, outdir), halnodes))
+
+    def process_template(self, context : dict) -> str:
+
+        env = get_environment()
 
         res = env.get_template("addrmap.j2").render(context)
         return res
 
+    def generate_template(self, context : dict, template : str = "addrmap.j2") -> 'Iterator[str]':
+        """Same as process_template, but yield the output in chunks instead of a single string"""
+
+        env = get_environment()
+
+        return env.get_template(template).generate(context)
@@ -1,21 +1,33 @@
-from systemrdl.node import Node, AddrmapNode, RegNode, RootNode, MemNode, FieldNode, AddressableNode, RegfileNode
-from typing import List, Dict
+from systemrdl.node import Node, AddrmapNode, RegNode, RootNode, MemNode, FieldNode, RegfileNode
+from systemrdl.rdltypes import OnWriteType
+from typing import List, Dict, Tuple, Iterator, Callable
+from operator import attrgetter
+import hashlib
+
+# The Hal classes extract everything the templates need from the systemrdl nodes when they
+# are created, and keep no reference to them, so the compiler tree can be released once
+# the hierarchy is built and rendering is only attribute lookups.
 
 class HalBase: # TODO make abstract
-    def __init__(self, 
+    __slots__ = ('parent', 'inst_name', 'orig_type_name', 'docstring')
+
+    def __init__(self,
                  node : Node,
                  parent : 'HalBase|None',
                  ):
-        self.node = node
         self.parent = parent
+        self.inst_name = node.inst_name
+        self.orig_type_name = node.orig_type_name if node.orig_type_name is not None else node.inst_name
+        self.docstring = self.format_docstring(node.get_property('desc'))
+
+    @staticmethod
+    def format_docstring(desc : 'str|None') -> str:
+        if desc is not None:
+            return "/*\n" + "".join("* " + l + "\n" for l in desc.splitlines()) + "*/"
+        return  ""
 
     def get_docstring(self) -> str:
-        desc = "/*\n"
-        if self.node.get_property('desc') is not None:
-            for l in self.node.get_property('desc').splitlines():
-                desc = desc + "* " + l + "\n"
-            return desc + "*/"
-        return  ""
+        return self.docstring
 
     @property
     def cpp_type(self) -> str:
@@ -26,7 +38,7 @@ class HalBase: # TODO make abstract
 
     def get_cls_tmpl_spec(self, just_tmpl=False) -> str:
         raise NotImplementedError("You need to overload this method in inherited class")
-    
+
     @property
     def type_name(self) -> str:
         return self.orig_type_name
@@ -36,75 +48,203 @@ class HalBase: # TODO make abstract
     def addr_offset(self) -> int:
         raise NotImplementedError("You need to overload this method in inherited class")
 
-    @property
-    def orig_type_name(self) -> str:
-        if self.node.orig_type_name is not None:
-            return self.node.orig_type_name
-        else:
-            return self.node.inst_name
-
     def get_parent_haladdrmap(self) -> 'HalAddrmap':
         if isinstance(self.parent, HalAddrmap):
             return self.parent
         assert self.parent is not None
         return self.parent.get_parent_haladdrmap()
-        
+
+_state_getters = {} # type: Dict[type, Callable]
+_state_scalars = (int, str, bool, type(None))
+
+def hal_state(obj, root : 'HalAddrmap', memo : 'Dict[int, tuple]'):
+    """Nested tuples of the slot values of a Hal object below root, without their parent"""
+    if isinstance(obj, list):
+        return tuple([hal_state(x, root, memo) for x in obj])
+    if isinstance(obj, dict):
+        return tuple(sorted((k, hal_state(v, root, memo)) for k, v in obj.items()))
+    if not isinstance(obj, (HalBase, HalEnum)):
+        return obj
+    if isinstance(obj, HalAddrmap) and obj is not root:
+        # The content of a child addrmap is rendered in its own header
+        return (obj.inst_name, obj.orig_type_name, obj.addr_offset)
+    state = memo.get(id(obj))
+    if state is None: # Registers are shared by the instances of an addrmap type
+        cls = type(obj)
+        getter = _state_getters.get(cls)
+        if getter is None:
+            slots = [s for c in cls.__mro__ for s in getattr(c, '__slots__', ()) if s not in ('parent', 'enum_registry', 'rdl_path')]
+            getter = _state_getters[cls] = attrgetter(*slots)
+        state = memo[id(obj)] = (cls.__name__, *[v if type(v) in _state_scalars else hal_state(v, root, memo) for v in getter(obj)])
+    return state
+
+class HalEnum:
+    """Enum definition, shared by all the fields encoded with it"""
+    __slots__ = ('name', 'cpp_name', 'strings', 'values', 'desc', 'const_width')
+
+    def __init__(self, encode, cpp_name : str):
+        self.name = encode.__name__
+        self.cpp_name = cpp_name
+        self.strings = []
+        self.values = []
+        self.desc = []
+        for k, v in encode.members.items():
+            self.strings.append(encode.members[k].name)
+            self.values.append(encode.members[k].value)
+            self.desc.append(encode.members[k].rdl_desc)
+
+        self.const_width = max(self.values).bit_length()
+
+    @staticmethod
+    def get_key(encode) -> 'Tuple':
+        return encode.__name__, tuple((m.name, m.value) for m in encode.members.values())
+
+class HalEnumRegistry:
+    """Index of the enums of a hierarchy, deduplicated by their definition
+
+    Enums with the same name and members are the same enum. Different definitions
+    with the same name get a unique cpp_name, so they can be emitted side by side.
+    """
+    def __init__(self):
+        self.enums = {} # type: Dict[Tuple, HalEnum]
+        self.by_encode = {} # type: Dict[int, HalEnum]
+        self.cpp_names = set()
+
+    def get(self, encode) -> HalEnum:
+        enum = self.by_encode.get(id(encode))
+        if enum is None:
+            key = HalEnum.get_key(encode)
+            enum = self.enums.get(key)
+            if enum is None:
+                cpp_name = encode.__name__
+                n = 0
+                while cpp_name in self.cpp_names:
+                    n += 1
+                    cpp_name = f"{encode.__name__}_{n}"
+                self.cpp_names.add(cpp_name)
+                enum = self.enums[key] = HalEnum(encode, cpp_name)
+            self.by_encode[id(encode)] = enum
+        return enum
+
+    def __iter__(self) -> 'Iterator[HalEnum]':
+        return iter(self.enums.values())
+
+    def __len__(self) -> int:
+        return len(self.enums)
+
 class HalField(HalBase):
+    __slots__ = ('low', 'high', 'width', 'is_sw_readable', 'is_sw_writable', 'enum', 'reset', 'onwrite', 'singlepulse',
+                 'onread', 'swacc')
+
+    # C++ field kind of each write side effect, and value of the bits that trigger it
+    WRITE_KINDS = {
+            'woclr' : ("W1C", 1),
+            'wzc'   : ("W0C", 0),
+            'woset' : ("W1S", 1),
+            'wzs'   : ("W0S", 0),
+            'wot'   : ("W1T", 1),
+            'wzt'   : ("W0T", 0),
+            }
 
-    def __init__(self, 
+    def __init__(self,
                  node: FieldNode,
                  parent : 'HalReg',
                  ):
         super().__init__(node, parent)
-        self.node = node # TODO REMOVE
-        self.parent = parent
-
-    @property
-    def width(self) -> int:
-        return self.node.width
+        self.low = node.low
+        self.high = node.high
+        self.width = node.width
+        self.is_sw_readable = node.is_sw_readable
+        self.is_sw_writable = node.is_sw_writable
+
+        reset = node.get_property('reset')
+        self.reset = reset if isinstance(reset, int) else 0 # Resets driven by a signal or field are unknown
+
+        onwrite = node.get_property('onwrite')
+        self.onwrite = onwrite.name if onwrite is not None else None # type: str|None
+        self.singlepulse = node.get_property('singlepulse')
+        onread = node.get_property('onread')
+        self.onread = onread.name if onread is not None else None # type: str|None
+        self.swacc = node.get_property('swacc')
+
+        encode = node.get_property('encode')
+        if encode is not None:
+            self.enum = self.get_parent_haladdrmap().enum_registry.get(encode) # type: HalEnum|None
+        else:
+            self.enum = None
 
     def has_enum(self) -> bool:
-        return self.node.get_property('encode', default=False) != False
+        return self.enum is not None
 
-    def get_enum(self):
-        encode = self.node.get_property('encode')
-        namespace_enums = self.get_namespace_enums()
-        if encode is not None:
-            name = encode.__name__
-            if name in namespace_enums:
-                if namespace_enums[name][-1] == self.node.owning_addrmap: # TODO WHAT???
-                    return False, None, None, None, None, None
-            enum_strings = []
-            enum_values = []
-            enum_desc = []
-            for k, v in encode.members.items():
-                enum_strings.append(encode.members[k].name)
-                enum_values.append(encode.members[k].value)
-                enum_desc.append(encode.members[k].rdl_desc)
-
-            const_width = max(enum_values).bit_length()
-
-            namespace_enums[name] = [enum_strings, enum_values, enum_desc, const_width, self.node.owning_addrmap]
-            return True, name, enum_strings, enum_values, enum_desc, const_width
-        
+    @property
+    def mask(self) -> int:
+        """Bits of the field in its register"""
+        return ((1 << self.width) - 1) << self.low
+
+    def get_enum(self, namespace_enums : 'Dict[HalEnum, str]'):
+        """Tuple of the enum of the field, the interface of the templates before the shared enums header"""
+        alias = self.get_namespace_enum(namespace_enums)
+        if alias is not None:
+            enum = self.enum
+            return True, alias, enum.strings, enum.values, enum.desc, enum.const_width
         return False, None, None, None, None, None
 
+    def get_namespace_enum(self, namespace_enums : 'Dict[HalEnum, str]') -> 'str|None':
+        """Name of the alias of the field enum in the addrmap namespace, None if it is already declared
+
+        namespace_enums maps the enums declared in the namespace to their alias. An enum that has
+        the name of another enum of the namespace is declared with its unique cpp_name instead.
+        """
+        if self.enum is None or self.enum in namespace_enums:
+            return None
+        aliases = set(namespace_enums.values())
+        alias = self.enum.name
+        if alias in aliases:
+            alias = self.enum.cpp_name
+            n = 0
+            while alias in aliases:
+                n += 1
+                alias = f"{self.enum.cpp_name}_{n}"
+        namespace_enums[self.enum] = alias
+        return alias
+
     def get_enum_name(self):
-        encode = self.node.get_property('encode')
-        if encode is not None:
-            return encode.__name__
+        if self.enum is not None:
+            return self.enum.name
 
-    def get_namespace_enums(self) -> 'Dict':
-        return self.get_parent_haladdrmap().enums
+    @property
+    def write_kind(self) -> 'str|None':
+        """Field kind of the write side effect, None for fields written with read-modify-write"""
+        if not self.is_sw_writable:
+            return None
+        if self.onwrite in self.WRITE_KINDS:
+            return self.WRITE_KINDS[self.onwrite][0]
+        if self.singlepulse:
+            return "Pulse"
+        return None
+
+    @property
+    def is_read_sensitive(self) -> bool:
+        """Reading the field has a side effect, SystemRDL onread, or swacc that signals the access to the hardware"""
+        return self.is_sw_readable and (self.onread is not None or bool(self.swacc))
+
+    @property
+    def wr_noop_val(self) -> int:
+        """Value of the field bits that can be written without side effect"""
+        if self.onwrite in self.WRITE_KINDS and self.WRITE_KINDS[self.onwrite][1] == 0:
+            return self.mask
+        return 0
 
     @property
     def cpp_type(self) -> str:
         out = ""
-        if self.node.is_sw_readable and self.node.is_sw_writable:
+        if self.write_kind is not None:
+            return "Field" + self.write_kind
+        if self.is_sw_readable and self.is_sw_writable:
             return "FieldRW"
-        elif self.node.is_sw_writable and not self.node.is_sw_readable:
+        elif self.is_sw_writable and not self.is_sw_readable:
             return "FieldWO"
-        elif self.node.is_sw_readable:
+        elif self.is_sw_readable:
             return "FieldRO"
         return out
 
@@ -115,37 +255,116 @@ class HalField(HalBase):
         assert False, "You should not extend FieldNode classes"
 
 class HalReg(HalBase):
-    
-    def __init__(self, 
+    __slots__ = ('bus_offset', 'address_offset', 'fields', 'is_array', 'array_stride', 'array_dimensions',
+                 'has_sw_readable', 'has_sw_writable', 'width', 'regwidth', 'accesswidth',
+                 'set_alias_offset', 'clr_alias_offset')
+
+    def __init__(self,
                  node : RegNode,
                  parent : 'HalAddrmap|HalRegfile',
                  bus_offset : int = 0,
                  ):
         super().__init__(node, parent)
-        self.node = node # TODO REMOVE
-        self.parent = parent
         self.bus_offset = bus_offset
+        self.address_offset = self.get_address_offset(node)
+        self.is_array = node.is_array
+        self.array_stride = node.array_stride
+        self.array_dimensions = node.array_dimensions
+
+        self.fields = self.get_fields(node)
+        self.width = max([c.high for c in self.fields]) + 1
+        self.regwidth = node.get_property('regwidth') # type: int
+        self.accesswidth = node.get_property('accesswidth') # type: int
+        self.has_sw_readable = any(c.is_sw_readable for c in self.fields)
+        self.has_sw_writable = any(c.is_sw_writable for c in self.fields)
+
+        self.set_alias_offset = None # type: int|None
+        self.clr_alias_offset = None # type: int|None
+        if node.has_aliases and not node.is_array:
+            self.add_aliases(node)
+
+    @staticmethod
+    def get_address_offset(node : RegNode) -> int:
+        return node.address_offset
+
+    def add_aliases(self, node : RegNode):
+        """Find the aliases whose writable fields are all woset (set alias) or all woclr (clear alias)"""
+        for alias in node.aliases():
+            onwrites = {f.get_property('onwrite') for f in alias.fields() if f.is_sw_writable}
+            if len(onwrites) != 1:
+                continue
+            onwrite = onwrites.pop()
+            if onwrite is OnWriteType.woset:
+                self.set_alias_offset = alias.address_offset - node.address_offset
+            elif onwrite is OnWriteType.woclr:
+                self.clr_alias_offset = alias.address_offset - node.address_offset
+
+    def get_fields(self, node : RegNode) -> 'List[HalField]':
+        return [HalField(c, self) for c in node.children() if isinstance(c, FieldNode)]
 
-        self.fields = self.get_fields()
-    
-    @property # TODO move to base?
-    def is_array(self) -> bool:
-        return self.node.is_array
+    @property
+    def sw_wr_mask(self) -> int:
+        """Bits of the register covered by software writable fields"""
+        mask = 0
+        for f in self.fields:
+            if f.is_sw_writable:
+                mask |= f.mask
+        return mask
+
+    @property
+    def wr_noop_mask(self) -> int:
+        """Bits of the fields with write side effects, never written back with their read value"""
+        mask = 0
+        for f in self.fields:
+            if f.write_kind is not None:
+                mask |= f.mask
+        return mask
 
     @property
-    def width(self) -> int:
-        return max([c.node.high for c in self.fields]) + 1
+    def wr_noop_val(self) -> int:
+        val = 0
+        for f in self.fields:
+            if f.write_kind is not None:
+                val |= f.wr_noop_val
+        return val
 
-    def get_fields(self) -> 'List[HalField]':
-        return [HalField(c, self) for c in self.node.children() if isinstance(c, FieldNode)]
+    @property
+    def is_read_sensitive(self) -> bool:
+        return any(f.is_read_sensitive for f in self.fields)
+
+    def has_field(self, name : str) -> bool:
+        """Fields are static members of the register class, the generated members must not reuse their names"""
+        return any(f.inst_name == name for f in self.fields)
+
+    @property
+    def has_value_type(self) -> bool:
+        """Readable registers get a value_type class, unless a field is already named value_type"""
+        return self.has_sw_readable and not self.has_field('value_type')
+
+    @property
+    def has_read_value(self) -> bool:
+        """Registers with a value_type get a read() method returning it, unless a field is already named read"""
+        return self.has_value_type and not self.has_field('read')
+
+    @property
+    def word_type(self) -> str:
+        """C++ type of the masks and values of the whole register"""
+        return "uint64_t" if self.regwidth > 32 else "uint32_t"
+
+    @property
+    def reset(self) -> int:
+        reset = 0
+        for f in self.fields:
+            reset |= (f.reset << f.low) & f.mask
+        return reset
 
     @property
     def cpp_type(self):
-        if self.node.has_sw_readable and self.node.has_sw_writable:
+        if self.has_sw_readable and self.has_sw_writable:
             return "RegRW"
-        elif self.node.has_sw_writable and not self.node.has_sw_readable:
+        elif self.has_sw_writable and not self.has_sw_readable:
             return "RegWO"
-        elif self.node.has_sw_readable:
+        elif self.has_sw_readable:
             return "RegRO"
         assert False
 
@@ -158,47 +377,41 @@ class HalReg(HalBase):
 
     @property
     def addr_offset(self) -> int:
-        return self.bus_offset + self.node.address_offset
+        return self.bus_offset + self.address_offset
 
 
 class HalArrReg(HalReg):
-    def __init__(self, 
+    __slots__ = ()
+
+    def __init__(self,
                  node : RegNode,
                  parent : 'HalAddrmap|HalRegfile',
                  bus_offset : int = 0,
                  ):
-        super().__init__(node, parent)
-        self.node = node # TODO REMOVE
-        self.bus_offset = bus_offset
-
         assert node.is_array, "Register Node is not array"
 
-        assert self.node.size == self.node.array_stride, f"Different stride than regwidth is not supported {self.node.size} {self.node.array_stride}"
+        assert node.size == node.array_stride, f"Different stride than regwidth is not supported {node.size} {node.array_stride}"
 
-    @property
-    def addr_offset(self):
-        return self.bus_offset + next(self.node.unrolled()).address_offset # type: ignore
+        super().__init__(node, parent, bus_offset)
+
+    @staticmethod
+    def get_address_offset(node : RegNode) -> int:
+        return next(node.unrolled()).address_offset # type: ignore
 
 
 class HalMem(HalBase):
-    
-    def __init__(self, 
+    __slots__ = ('bus_offset', 'address_offset', 'size', 'memwidth')
+
+    def __init__(self,
                  node : MemNode,
                  parent : 'HalAddrmap',
                  bus_offset : int = 0,
                  ):
         super().__init__(node, parent)
-        self.node = node
-        self.parent = parent
         self.bus_offset = bus_offset
-
-        for c in self.parent.node.children():
-            if isinstance(c, AddressableNode):
-                assert c == self.node, f"Addrmaps with anything else than one memory node is currently not allowed, it could be easily added"
-
-    @property
-    def size(self) -> int:
-        return self.node.size
+        self.address_offset = node.address_offset
+        self.size = node.size
+        self.memwidth = node.get_property('memwidth') # type: int
 
     @property
     def width(self) -> int: # TODO probably not good
@@ -221,36 +434,38 @@ class HalMem(HalBase):
 
     @property
     def addr_offset(self) -> int:
-        return self.bus_offset + self.node.address_offset
+        return self.bus_offset + self.address_offset
 
 class HalRegfile(HalBase):
-    
-    def __init__(self, 
+    __slots__ = ('bus_offset', 'address_offset', 'regs', 'regfiles', 'is_array', 'array_stride', 'array_dimensions')
+
+    def __init__(self,
                  node : RegfileNode,
                  parent : 'HalAddrmap',
                  bus_offset : int = 0,
                  ):
         super().__init__(node, parent)
-        self.node = node # TODO REMOVE
-        self.parent = parent
         self.bus_offset = bus_offset
+        self.address_offset = next(node.unrolled()).address_offset # type: ignore
+        self.is_array = node.is_array
+        self.array_stride = node.array_stride
+        self.array_dimensions = node.array_dimensions
 
-        self.regs = self.get_regs()
-        self.regfiles = self.get_regfiles()
-    
-    @property # TODO move to base?
-    def is_array(self) -> bool:
-        return self.node.is_array
+        self.regs = []
+        self.regfiles = []
+        self.add_children(node)
 
     # @property
     # def width(self) -> int:
     #     return max([c.node.high for c in self.]) + 1
 
-    def get_regs(self) -> 'List[HalReg]':
-        return [HalReg(c, self) for c in self.node.children() if isinstance(c, RegNode)]
-
-    def get_regfiles(self) -> 'List[HalRegfile]':
-        return [HalRegfile(c, self) for c in self.node.children() if isinstance(c, RegfileNode)]
+    def add_children(self, node : RegfileNode):
+        """Create the Hal nodes of the children in a single walk over the node children"""
+        for c in node.children():
+            if isinstance(c, RegNode):
+                self.regs.append(HalReg(c, self))
+            elif isinstance(c, RegfileNode):
+                self.regfiles.append(HalRegfile(c, self))
 
     @property
     def cpp_type(self):
@@ -265,95 +480,130 @@ class HalRegfile(HalBase):
 
     @property
     def addr_offset(self) -> int:
-        return self.bus_offset + next(self.node.unrolled()).address_offset # type: ignore
+        return self.bus_offset + self.address_offset
 
 class HalArrRegfile(HalRegfile):
-    def __init__(self, 
+    __slots__ = ()
+
+    def __init__(self,
                  node : RegfileNode,
                  parent : 'HalAddrmap|HalRegfile',
                  bus_offset : int = 0,
                  ):
-        super().__init__(node, parent)
-        self.node = node # TODO REMOVE
-        self.bus_offset = bus_offset
-
         assert node.is_array, "Register File Node is not array"
 
-        assert self.node.size == self.node.array_stride, f"Different stride than regwidth is not supported {self.node.size} {self.node.array_stride}"
+        assert node.size == node.array_stride, f"Different stride than regwidth is not supported {node.size} {node.array_stride}"
 
-    @property
-    def addr_offset(self):
-        return self.bus_offset + next(self.node.unrolled()).address_offset # type: ignore
+        super().__init__(node, parent, bus_offset)
 
 
 
 class HalAddrmap(HalBase):
+    __slots__ = ('bus_offset', 'address_offset', 'regs', 'mems', 'addrmaps', 'regfiles', 'enum_registry', 'rdl_path')
+
     def __init__(self,
             node : AddrmapNode,
             parent : 'HalAddrmap|None' = None,
             bus_offset : int = 0,
+            type_cache : 'Dict|None' = None,
+            enum_registry : 'HalEnumRegistry|None' = None,
             ):
+        """type_cache and enum_registry can be shared by the root addrmaps of several tops
+        exported together, so the addrmap types they share get the same registers and enums"""
         super().__init__(node, parent)
-        self.node = node # TODO REMOVE
-        self.parent = parent
         self.bus_offset = bus_offset
+        self.address_offset = node.address_offset
+        self.rdl_path = node.get_path() # Keeps the buses, that remove_buses() takes out of the hierarchy
 
-        assert (self.parent == None) == isinstance(self.node.parent, RootNode)
+        assert (self.parent == None) == isinstance(node.parent, RootNode)
 
-        self.regs = self.get_regs()
-        self.mems = self.get_mems()
-        self.addrmaps = self.get_addrmaps()
-        self.regfiles = self.get_regfiles()
-        
-
-
-        self.enums = {}
+        # The enums of the whole hierarchy are indexed once, in the root addrmap
+        if parent is not None:
+            self.enum_registry = parent.enum_registry
+        else:
+            self.enum_registry = enum_registry if enum_registry is not None else HalEnumRegistry()
+
+        # Registers, memories and regfiles are the same for every instance of a type,
+        # so they are built once per type and shared, only the addrmaps are per instance
+        if type_cache is None:
+            type_cache = {}
+        type_key = self.get_type_key(node)
+        if type_key is not None and type_key in type_cache:
+            self.regs, self.mems, self.regfiles, addrmap_idxs = type_cache[type_key]
+            # Avoid walking all the children of the instance again, only create the addrmaps
+            children = node.inst.children
+            self.addrmaps = [HalAddrmap(AddrmapNode(children[i], node.env, node), self, type_cache=type_cache) for i in addrmap_idxs]
+        else:
+            self.regs = []
+            self.mems = []
+            self.addrmaps = []
+            self.regfiles = []
+            addrmap_idxs = self.add_children(node, type_cache)
+            if type_key is not None:
+                type_cache[type_key] = (self.regs, self.mems, self.regfiles, addrmap_idxs)
+
+        assert len(self.mems) == 0 or len(self.regs) + len(self.mems) + len(self.addrmaps) + len(self.regfiles) == 1, \
+                f"Addrmaps with anything else than one memory node is currently not allowed, it could be easily added"
+
+    @staticmethod
+    def get_type_key(node : AddrmapNode) -> 'Tuple[int, str]|None':
+        """Key identifying the addrmap definition, None if it cannot be identified"""
+        if node.inst.original_def is None: # From an importer, no definition to compare
+            return None
+        return id(node.inst.original_def), node.type_name
 
     @property
     def is_root_node(self) -> bool:
         return self.parent == None
 
-    def get_regs(self) -> 'List[HalReg]':
-        regs = []
-        for c in self.node.children():
-            if isinstance(c, RegNode):
-                reg = HalArrReg(c, self) if c.is_array else HalReg(c, self)
-                regs.append(reg)
-        return regs
-        # return [HalReg(c) for c in self.node.children() if isinstance(c, RegNode)]
-
-    def get_mems(self) -> 'List[HalMem]':
-        return [HalMem(c, self) for c in self.node.children() if isinstance(c, MemNode)]
+    def fingerprint(self) -> str:
+        """Digest of everything the header of this addrmap is rendered from, not including the export options"""
+        state = (self.is_root_node, hal_state(self, self, {}))
+        return hashlib.sha256(repr(state).encode('utf-8')).hexdigest()
 
-    def get_addrmaps(self) -> 'List[HalAddrmap]':
-        return [HalAddrmap(c, self) for c in self.node.children() if isinstance(c, AddrmapNode)]
+    def add_children(self, node : AddrmapNode, type_cache : 'Dict|None' = None) -> 'List[int]':
+        """Create the Hal nodes of the children in a single walk over the node children
 
-    def get_regfiles(self) -> 'List[HalRegfile]':
-        regfiles = []
-        for c in self.node.children():
-            if isinstance(c, RegfileNode):
-                regfile = HalArrRegfile(c, self) if c.is_array else HalRegfile(c, self)
-                regfiles.append(regfile)
-        return regfiles
+        Returns the indexes of the addrmaps in the children of the component
+        """
+        addrmap_idxs = []
+        idx_of = {id(inst): i for i, inst in enumerate(node.inst.children)}
+        for c in node.children():
+            if isinstance(c, RegNode):
+                self.regs.append(HalArrReg(c, self) if c.is_array else HalReg(c, self))
+            elif isinstance(c, MemNode):
+                self.mems.append(HalMem(c, self))
+            elif isinstance(c, AddrmapNode):
+                self.addrmaps.append(HalAddrmap(c, self, type_cache=type_cache))
+                addrmap_idxs.append(idx_of[id(c.inst)])
+            elif isinstance(c, RegfileNode):
+                self.regfiles.append(HalArrRegfile(c, self) if c.is_array else HalRegfile(c, self))
+        return addrmap_idxs
 
     def remove_buses(self):
-        remove_list = []
+        """Replace the child addrmaps that are buses with the addrmaps they contain
+
+        Kept addrmaps stay first in their original order, followed by the ones taken from the buses
+        """
         for c in self.addrmaps:
             c.remove_buses()
-            if c.is_bus(): # Doesnt have registers or memories, only addrmaps
-                for subc in c.addrmaps: # Change parent
-                    subc.bus_offset += c.addr_offset
-                    subc.parent = self
-                remove_list.append(c)
-                self.addrmaps.extend(c.addrmaps) # Steal all addrmaps from a bus
-                
-        [self.addrmaps.remove(c) for c in remove_list]
+        buses = [c for c in self.addrmaps if c.is_bus()] # Doesnt have registers or memories, only addrmaps
+        if not buses:
+            return
+        for c in buses:
+            for subc in c.addrmaps: # Change parent
+                subc.bus_offset += c.addr_offset
+                subc.parent = self
+        self.addrmaps = [c for c in self.addrmaps if not c.is_bus()] + [subc for c in buses for subc in c.addrmaps]
 
     def is_bus(self) -> bool:
         if len(self.regs) == 0 and len(self.mems) == 0 and len(self.regfiles) == 0:
             return True
         return False
 
+    def has_enums(self) -> bool:
+        return any(f.enum is not None for r in self.regs + self.get_regfiles_regs() for f in r.fields)
+
     def get_regfiles_regs(self) -> 'List[HalReg]':
         regs = []
         for regfile in self.regfiles:
@@ -362,9 +612,9 @@ class HalAddrmap(HalBase):
 
     def get_template_line(self) -> str:
         if self.is_root_node:
-            return "template <uint32_t BASE, typename PARENT_TYPE=void>"
+            return "template <uint32_t BASE, typename PARENT_TYPE=void, typename IO_TYPE=ArchIoNode>"
         return "template <uint32_t BASE, typename PARENT_TYPE>"
-    
+
     @property
     def type_name(self) -> str:
         return self.orig_type_name + "_hal"
@@ -373,18 +623,26 @@ class HalAddrmap(HalBase):
         str = self.type_name.upper() if not just_tmpl else ""
 
         if self.is_root_node:
-            return str + "<BASE, PARENT_TYPE>"
+            return str + "<BASE, PARENT_TYPE, IO_TYPE>"
         return str + "<BASE, PARENT_TYPE>"
 
-    def get_addrmaps_recursive(self):
-        addrmaps = self.addrmaps.copy()
-        for c in self.addrmaps:
-            addrmaps.extend(c.get_addrmaps_recursive())
+    def get_addrmaps_recursive(self) -> 'List[HalAddrmap]':
+        return list(self.iter_addrmaps_recursive())
+
+    def iter_addrmaps_recursive(self) -> 'Iterator[HalAddrmap]':
+        """Yield the addrmaps below this one, and itself first if it is the root node
+
+        The children of an addrmap are yielded before the addrmaps below them
+        """
         if self.is_root_node:
-            addrmaps.insert(0, self)
-        return addrmaps
+            yield self
+        stack = [self]
+        while stack:
+            halnode = stack.pop()
+            yield from halnode.addrmaps
+            stack.extend(reversed(halnode.addrmaps))
 
     @property
     def addr_offset(self) -> int:
-        return self.bus_offset + self.node.address_offset
+        return self.bus_offset + self.address_offset
 
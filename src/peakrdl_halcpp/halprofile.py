@@ -0,0 +1,116 @@
+from typing import List, Dict, Tuple, Optional, TextIO
+from contextlib import contextmanager
+import cProfile
+import sys
+import time
+import tracemalloc
+
+class HalProfiler():
+    """Wall time and peak memory of the export phases
+
+    A disabled profiler records nothing, so the exporter can use it unconditionally.
+    Memory is measured with tracemalloc, peaks are per phase on python >= 3.9,
+    on older versions they are the peak since the profiler was started.
+    """
+    def __init__(self,
+                 enabled : bool = True,
+                 top_n : int = 10,
+                 dump_file : Optional[str] = None,
+                 ) -> None:
+        self.enabled = enabled
+        self.top_n = top_n
+        self.dump_file = dump_file
+
+        self.records = [] # type: List[Tuple[str, str, float, int]]
+        self.cprofile = None # type: Optional[cProfile.Profile]
+        self.started_tracemalloc = False
+        self.start_time = 0.0
+
+    @property
+    def dump_folded(self) -> bool:
+        return self.dump_file is not None and self.dump_file.endswith(".folded")
+
+    def start(self):
+        if not self.enabled:
+            return
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracemalloc = True
+        if self.dump_file is not None and not self.dump_folded:
+            self.cprofile = cProfile.Profile()
+            self.cprofile.enable()
+        self.start_time = time.perf_counter()
+
+    def stop(self):
+        if not self.enabled:
+            return
+        peak = max([tracemalloc.get_traced_memory()[1]] + [r[3] for r in self.records])
+        self.records.append(("export", "", time.perf_counter() - self.start_time, peak))
+        if self.cprofile is not None:
+            self.cprofile.disable()
+        if self.started_tracemalloc:
+            tracemalloc.stop()
+            self.started_tracemalloc = False
+
+    @contextmanager
+    def phase(self, phase : str, name : str = ""):
+        if not self.enabled:
+            yield
+            return
+        if hasattr(tracemalloc, 'reset_peak'): # Python >= 3.9
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.records.append((phase, name, time.perf_counter() - start, tracemalloc.get_traced_memory()[1]))
+
+    def get_phase_totals(self) -> 'Dict[str, Tuple[int, float, int]]':
+        """Return {phase: (count, total time, peak memory)} in the order the phases first ran"""
+        totals = {} # type: Dict[str, Tuple[int, float, int]]
+        for phase, _, t, peak in self.records:
+            count, total, max_peak = totals.get(phase, (0, 0.0, 0))
+            totals[phase] = (count + 1, total + t, max(max_peak, peak))
+        return totals
+
+    def get_slowest(self, phases : Tuple[str, ...] = ("render", "write")) -> 'List[Tuple[str, float]]':
+        """Return the top_n slowest names, summing their time in the given phases"""
+        per_name = {} # type: Dict[str, float]
+        for phase, name, t, _ in self.records:
+            if phase in phases:
+                per_name[name] = per_name.get(name, 0.0) + t
+        return sorted(per_name.items(), key=lambda x: x[1], reverse=True)[:self.top_n]
+
+    def report(self, file : TextIO = sys.stderr):
+        if not self.enabled:
+            return
+        print("PeakRDL-halcpp export profile", file=file)
+        print(f"{'phase':<20}{'count':>8}{'total [ms]':>14}{'peak [MB]':>12}", file=file)
+        for phase, (count, total, peak) in self.get_phase_totals().items():
+            print(f"{phase:<20}{count:>8}{total * 1e3:>14.2f}{peak / 1e6:>12.2f}", file=file)
+
+        slowest = self.get_slowest()
+        if slowest:
+            print(f"Slowest {len(slowest)} addrmaps (render + write):", file=file)
+            for name, t in slowest:
+                print(f"    {name:<40}{t * 1e3:>10.2f} ms", file=file)
+
+        if self.dump_file is not None:
+            self.dump()
+            print(f"Profile written to {self.dump_file}", file=file)
+
+    def dump(self):
+        """Write cProfile statistics, or collapsed stacks of the phases if the file ends with .folded
+
+        The collapsed stacks (one 'export;phase;name microseconds' per line) can be
+        given to flamegraph.pl, speedscope or inferno.
+        """
+        if self.dump_folded:
+            with open(self.dump_file, 'w') as f:
+                for phase, name, t, _ in self.records:
+                    if phase == "export":
+                        continue
+                    stack = ";".join(x for x in ("export", phase, name) if x)
+                    f.write(f"{stack} {round(t * 1e6)}\n")
+        elif self.cprofile is not None:
+            self.cprofile.dump_stats(self.dump_file)
@@ -0,0 +1,352 @@
+import bisect
+import json
+import mmap
+import struct
+import sys
+from array import array
+from collections import namedtuple
+from typing import List, Tuple, Iterator
+
+from .haladdrmap import HalAddrmap, HalRegfile, HalReg, HalMem
+
+# Flat register map of an exported hierarchy, to decode bus addresses back to register and field names.
+#
+# Every register, register array and memory is one entry, an address interval of count elements of
+# size bytes, stride bytes apart. Arrays of registers stay a single entry, the element index is computed
+# from the address, arrays of regfiles are unrolled into one entry per register of each regfile.
+#
+# The binary file is the lookup index, little endian columns of the entries sorted by address,
+# each column aligned to 8 bytes, so they can be mapped directly as arrays:
+#   header  : magic, version, entries, fields, dims, strings size
+#   entries : base u64, end u64, stride u32, size u32, flags u32, name offset u32, name length u32,
+#             first field u32, field count u32, first dim u32, dim count u32,
+#             RDL path offset u32, RDL path length u32
+#   fields  : low u8, high u8, flags u8, name offset u32, name length u32
+#   dims    : u32, the array dimensions of the entries
+#   strings : utf-8 names
+
+MAGIC = b"HALRMAP\0"
+VERSION = 2
+HEADER = struct.Struct("<8sIIIII4x")
+
+READABLE = 1
+WRITABLE = 2
+MEMORY = 4
+
+ENTRY_COLUMNS = (('base', 'Q'), ('end', 'Q'), ('stride', 'I'), ('size', 'I'), ('flags', 'I'),
+                 ('name_off', 'I'), ('name_len', 'I'), ('field_first', 'I'), ('field_count', 'I'),
+                 ('dim_first', 'I'), ('dim_count', 'I'), ('rdl_off', 'I'), ('rdl_len', 'I'))
+FIELD_COLUMNS = (('low', 'B'), ('high', 'B'), ('flags', 'B'), ('name_off', 'I'), ('name_len', 'I'))
+
+Field = namedtuple('Field', ['name', 'low', 'high', 'readable', 'writable'])
+Register = namedtuple('Register', ['path', 'addr', 'offset', 'size', 'readable', 'writable', 'is_mem', 'fields', 'rdl_path'])
+
+
+class RegmapEntry:
+    """path follows the generated C++ hierarchy, rdl_path the SystemRDL one, with the buses"""
+    __slots__ = ('path', 'rdl_path', 'base', 'size', 'stride', 'dims', 'flags', 'reset', 'fields')
+
+    def __init__(self, path : str, rdl_path : str, base : int, size : int, stride : int, dims : 'List[int]', flags : int, reset : int, fields : list):
+        self.path = path
+        self.rdl_path = rdl_path
+        self.base = base
+        self.size = size
+        self.stride = stride
+        self.dims = dims
+        self.flags = flags
+        self.reset = reset
+        self.fields = fields # type: List[Tuple[str, int, int, int, int]]
+
+    @property
+    def count(self) -> int:
+        count = 1
+        for d in self.dims:
+            count *= d
+        return count
+
+    @property
+    def end(self) -> int:
+        return self.base + (self.count - 1) * self.stride + self.size
+
+    def to_dict(self) -> dict:
+        return {
+                'path'     : self.path,
+                'rdl_path' : self.rdl_path,
+                'addr'     : self.base,
+                'size'     : self.size,
+                'stride'   : self.stride,
+                'dims'     : self.dims,
+                'access'   : access_str(self.flags),
+                'kind'     : "mem" if self.flags & MEMORY else "reg",
+                'reset'    : self.reset,
+                'fields'   : [{'name': name, 'low': low, 'high': high, 'access': access_str(flags), 'reset': reset}
+                              for name, low, high, flags, reset in self.fields],
+                }
+
+
+def access_str(flags : int) -> str:
+    return ("r" if flags & READABLE else "") + ("w" if flags & WRITABLE else "")
+
+
+def reg_entry(reg : HalReg, path : str, rdl_path : str, base : int) -> RegmapEntry:
+    flags = (READABLE if reg.has_sw_readable else 0) | (WRITABLE if reg.has_sw_writable else 0)
+    fields = [(f.inst_name, f.low, f.high, (READABLE if f.is_sw_readable else 0) | (WRITABLE if f.is_sw_writable else 0), f.reset)
+              for f in reg.fields]
+    size = reg.regwidth // 8
+    dims = list(reg.array_dimensions) if reg.is_array else []
+    return RegmapEntry(path + reg.inst_name, rdl_path + reg.inst_name, base + reg.addr_offset, size, reg.array_stride if reg.is_array else size,
+                       dims, flags, reg.reset, fields)
+
+
+def mem_entry(mem : HalMem, path : str, rdl_path : str, base : int) -> RegmapEntry:
+    size = mem.memwidth // 8
+    return RegmapEntry(path + mem.inst_name, rdl_path + mem.inst_name, base + mem.addr_offset, size, size, [mem.size // size],
+                       READABLE | WRITABLE | MEMORY, 0, [])
+
+
+def iter_unrolled(dims : 'List[int]') -> 'Iterator[Tuple[int, ...]]':
+    """Yield the indices of an array in row major order"""
+    if not dims:
+        yield ()
+        return
+    for i in range(dims[0]):
+        for rest in iter_unrolled(dims[1:]):
+            yield (i, *rest)
+
+
+def iter_regfile_entries(regfile : HalRegfile, path : str, rdl_path : str, base : int) -> 'Iterator[RegmapEntry]':
+    base += regfile.addr_offset
+    dims = list(regfile.array_dimensions) if regfile.is_array else []
+    for idx in iter_unrolled(dims):
+        offset = 0
+        for i, d in zip(idx, dims[1:] + [1]):
+            offset = (offset + i) * d
+        elem_name = regfile.inst_name + "".join(f"[{i}]" for i in idx) + "."
+        elem_base = base + offset * regfile.array_stride if dims else base
+        for r in regfile.regs:
+            yield reg_entry(r, path + elem_name, rdl_path + elem_name, elem_base)
+        for rf in regfile.regfiles:
+            yield from iter_regfile_entries(rf, path + elem_name, rdl_path + elem_name, elem_base)
+
+
+def iter_entries(halnode : HalAddrmap, path : str = "", base : int = 0) -> 'Iterator[RegmapEntry]':
+    """Yield the entries of the addrmap and of the addrmaps below it, in hierarchy order"""
+    path += halnode.inst_name + "."
+    rdl_path = halnode.rdl_path + "."
+    base += halnode.addr_offset
+    for r in halnode.regs:
+        yield reg_entry(r, path, rdl_path, base)
+    for m in halnode.mems:
+        yield mem_entry(m, path, rdl_path, base)
+    for rf in halnode.regfiles:
+        yield from iter_regfile_entries(rf, path, rdl_path, base)
+    for a in halnode.addrmaps:
+        yield from iter_entries(a, path, base)
+
+
+def build_regmap(top : HalAddrmap) -> 'List[RegmapEntry]':
+    """Return the entries of the hierarchy sorted by address
+
+    Entries at the same address, like aliases, are sorted so the first one of the hierarchy is found by lookups.
+    """
+    entries = list(iter_entries(top))
+    order = sorted(range(len(entries)), key=lambda i: (entries[i].base, -i))
+    return [entries[i] for i in order]
+
+
+def regmap_json(entries : 'List[RegmapEntry]', generator : str) -> str:
+    return json.dumps({'generator': generator, 'entries': [e.to_dict() for e in entries]}, indent=1) + "\n"
+
+
+def regmap_binary(entries : 'List[RegmapEntry]') -> bytes:
+    strings = bytearray()
+    names = {}
+
+    def intern(name : str) -> 'Tuple[int, int]':
+        if name not in names:
+            data = name.encode('utf-8')
+            names[name] = (len(strings), len(data))
+            strings.extend(data)
+        return names[name]
+
+    cols = {name: [] for name, _ in ENTRY_COLUMNS}
+    fcols = {name: [] for name, _ in FIELD_COLUMNS}
+    dims = []
+    for e in entries:
+        name_off, name_len = intern(e.path)
+        rdl_off, rdl_len = intern(e.rdl_path)
+        row = {
+                'base': e.base, 'end': e.end, 'stride': e.stride, 'size': e.size, 'flags': e.flags,
+                'name_off': name_off, 'name_len': name_len,
+                'field_first': len(fcols['low']), 'field_count': len(e.fields),
+                'dim_first': len(dims), 'dim_count': len(e.dims),
+                'rdl_off': rdl_off, 'rdl_len': rdl_len,
+                }
+        for name, _ in ENTRY_COLUMNS:
+            cols[name].append(row[name])
+        for fname, low, high, flags, _ in e.fields:
+            off, length = intern(fname)
+            for name, val in zip(('low', 'high', 'flags', 'name_off', 'name_len'), (low, high, flags, off, length)):
+                fcols[name].append(val)
+        dims.extend(e.dims)
+
+    out = bytearray(HEADER.pack(MAGIC, VERSION, len(entries), len(fcols['low']), len(dims), len(strings)))
+
+    def add_column(typecode : str, values : list):
+        out.extend(struct.pack(f"<{len(values)}{typecode}", *values))
+        out.extend(bytes(-len(out) % 8))
+
+    for name, typecode in ENTRY_COLUMNS:
+        add_column(typecode, cols[name])
+    for name, typecode in FIELD_COLUMNS:
+        add_column(typecode, fcols[name])
+    add_column('I', dims)
+    out.extend(strings)
+    return bytes(out)
+
+
+class RegMap:
+    """Address decoder reading the binary register map written by the exporter with regmap=True
+
+        rmap = RegMap("out/soc_regmap.bin")
+        reg = rmap.lookup(0x40000004)
+        reg.path, reg.offset, [f.name for f in reg.fields]
+
+    The file is memory mapped, single lookups bisect the base address column.
+    decode() and paths() decode arrays of addresses with numpy, which is then required.
+    """
+
+    def __init__(self, path : str):
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.n_entries, n_fields, n_dims, n_strings = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} halcpp register map")
+
+        self._offsets = {}
+        offset = HEADER.size
+        for prefix, columns, n in (('', ENTRY_COLUMNS, self.n_entries), ('field_', FIELD_COLUMNS, n_fields), ('', (('dims', 'I'),), n_dims)):
+            for name, typecode in columns:
+                self._offsets[prefix + name] = (offset, typecode, n)
+                offset += struct.calcsize(typecode) * n
+                offset += -offset % 8
+        self._strings = offset
+        self._cols = {name: self._column(name) for name in self._offsets}
+
+    def _column(self, name : str):
+        offset, typecode, n = self._offsets[name]
+        data = memoryview(self._mm)[offset:offset + struct.calcsize(typecode) * n]
+        if sys.byteorder == 'little':
+            return data.cast(typecode)
+        col = array(typecode, data)
+        col.byteswap()
+        return col
+
+    def close(self):
+        self._cols = {}
+        self._mm.close()
+
+    def __enter__(self) -> 'RegMap':
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self) -> int:
+        return self.n_entries
+
+    def _string(self, off : int, length : int) -> str:
+        start = self._strings + off
+        return self._mm[start:start + length].decode('utf-8')
+
+    def find(self, addr : int) -> int:
+        """Index of the entry containing addr, -1 if there is none"""
+        idx = bisect.bisect_right(self._cols['base'], addr) - 1
+        if idx < 0 or addr >= self._cols['end'][idx]:
+            return -1
+        if (addr - self._cols['base'][idx]) % self._cols['stride'][idx] >= self._cols['size'][idx]:
+            return -1
+        return idx
+
+    def _element_suffix(self, idx : int, element : int) -> str:
+        first, count = self._cols['dim_first'][idx], self._cols['dim_count'][idx]
+        indices = []
+        for d in reversed(self._cols['dims'][first:first + count]):
+            indices.append(element % d)
+            element //= d
+        return "".join(f"[{i}]" for i in reversed(indices))
+
+    def entry_path(self, idx : int, element : int = 0) -> str:
+        """Path of an entry, with the indices of its element if it is an array"""
+        return self._string(self._cols['name_off'][idx], self._cols['name_len'][idx]) + self._element_suffix(idx, element)
+
+    def entry_rdl_path(self, idx : int, element : int = 0) -> str:
+        """SystemRDL path of an entry, including the buses that are not part of its C++ path"""
+        return self._string(self._cols['rdl_off'][idx], self._cols['rdl_len'][idx]) + self._element_suffix(idx, element)
+
+    def lookup(self, addr : int, size : 'int|None' = None) -> 'Register|None':
+        """Register or memory at addr, None if the address is not mapped
+
+        The returned fields are the ones overlapping the size bytes accessed at addr,
+        all the fields of the register if size is None.
+        """
+        idx = self.find(addr)
+        if idx < 0:
+            return None
+        c = self._cols
+        element, offset = divmod(addr - c['base'][idx], c['stride'][idx])
+        if size is None:
+            low, high = 0, 8 * c['size'][idx] - 1
+        else:
+            low, high = 8 * offset, 8 * (offset + size) - 1
+        fields = []
+        first = c['field_first'][idx]
+        for f in range(first, first + c['field_count'][idx]):
+            if c['field_low'][f] <= high and c['field_high'][f] >= low:
+                flags = c['field_flags'][f]
+                fields.append(Field(self._string(c['field_name_off'][f], c['field_name_len'][f]),
+                                    c['field_low'][f], c['field_high'][f], bool(flags & READABLE), bool(flags & WRITABLE)))
+        flags = c['flags'][idx]
+        return Register(self.entry_path(idx, element), addr - offset, offset, c['size'][idx],
+                        bool(flags & READABLE), bool(flags & WRITABLE), bool(flags & MEMORY), fields,
+                        self.entry_rdl_path(idx, element))
+
+    def _np_column(self, np, name : str):
+        offset, typecode, n = self._offsets[name]
+        return np.frombuffer(self._mm, dtype=np.dtype(typecode).newbyteorder('<'), count=n, offset=offset)
+
+    def decode(self, addrs) -> 'Tuple':
+        """Decode an array of addresses, returns the arrays (entries, elements)
+
+        entries are the indices of the entries containing the addresses, -1 for the unmapped
+        addresses, and elements the indices of the array elements, 0 for registers and the unmapped addresses.
+        """
+        import numpy as np
+        addrs = np.asarray(addrs, dtype=np.uint64)
+        if self.n_entries == 0: # Nothing is mapped, and there is no entry to index
+            return np.full(addrs.shape, -1, dtype=np.int64), np.zeros(addrs.shape, dtype=np.int64)
+        bases = self._np_column(np, 'base')
+        ends = self._np_column(np, 'end')
+        strides = self._np_column(np, 'stride').astype(np.uint64)
+        sizes = self._np_column(np, 'size').astype(np.uint64)
+
+        entries = np.searchsorted(bases, addrs, side='right').astype(np.int64) - 1
+        idx = np.maximum(entries, 0)
+        rel = addrs - bases[idx]
+        elements, offsets = np.divmod(rel, strides[idx])
+        valid = (entries >= 0) & (addrs < ends[idx]) & (offsets < sizes[idx])
+        entries[~valid] = -1
+        return entries, np.where(valid, elements, 0).astype(np.int64)
+
+    def paths(self, addrs):
+        """Paths of the registers at an array of addresses, as a numpy object array, None for the unmapped addresses"""
+        import numpy as np
+        entries, elements = self.decode(addrs)
+        # Number the elements of all the entries, to format each distinct path once
+        counts = (self._np_column(np, 'end') - self._np_column(np, 'base')) // self._np_column(np, 'stride').astype(np.uint64)
+        first = np.concatenate([[0], np.cumsum(counts.astype(np.int64) + 1)])
+        keys = np.where(entries >= 0, first[np.maximum(entries, 0)] + elements, -1)
+        unique, inverse = np.unique(keys, return_inverse=True)
+        entry_of = np.searchsorted(first, unique, side='right') - 1
+        names = np.array([self.entry_path(int(e), int(k - first[e])) if k >= 0 else None for e, k in zip(entry_of, unique)], dtype=object)
+        return names[inverse.reshape(-1)]
@@ -0,0 +1,180 @@
+from collections import namedtuple
+from itertools import product
+from typing import List, Tuple, Iterator, TYPE_CHECKING
+
+from .haladdrmap import HalAddrmap, HalReg, HalArrReg, HalRegfile
+
+if TYPE_CHECKING:
+    from .halutils import HalUtils
+
+# Snapshot of the registers of an addrmap, the snapshot_type struct of the generated addrmap class,
+# saved by its snapshot() and written back by its restore().
+#
+# The struct has a member per readable and writable register of the addrmap, in address order,
+# register arrays are C arrays, and regfiles are nested structs of their registers. The registers
+# that are both contiguous on the bus and in the struct are transferred as a single block by the IO
+# class, a snapshot of an addrmap without gaps is then one read_block() and one write_block().
+#
+# Registers with a read side effect are not saved, nor are the read-only and write-only registers,
+# that cannot be both saved and restored. Registers with write side effects are saved, and restored
+# with their no-op value in the fields with side effects, so they break the blocks of restore().
+
+# One register of the snapshot: member is the C++ expression of its value in the struct, offset its
+# byte offset in the struct, addr its address relative to the addrmap, reg_type its C++ register type
+Slot = namedtuple('Slot', ['member', 'offset', 'addr', 'regwidth', 'reg_type', 'halreg'])
+
+def align(offset : int, alignment : int) -> int:
+    return (offset + alignment - 1) // alignment * alignment
+
+class HalSnapshot():
+    def __init__(self, halnode : HalAddrmap, halutils : 'HalUtils') -> None:
+        self.halnode = halnode
+        self.halutils = halutils
+        self.ns = halnode.orig_type_name + "_nm"
+
+        self.types = [] # type: List[Tuple[str, List[Tuple[str, str, int]], int]] # Regfile structs: name, members, size
+        self.members = [] # type: List[Tuple[str, str, int]] # Members of snapshot_type: declaration, name and offset
+        self.slots = [] # type: List[Slot]
+        self.size = 0
+        self.alignment = 1
+
+        for c in sorted(self.halnode.regs + self.halnode.regfiles, key=lambda c: c.addr_offset):
+            if isinstance(c, HalRegfile):
+                self.add_regfile(c)
+            elif self.is_saved(c):
+                self.add_reg(c)
+
+    @property
+    def names(self) -> 'List[str]':
+        """Members the snapshot adds to the addrmap class"""
+        return ["snapshot_type", "snapshot", "restore"] + [name for name, _, _ in self.types]
+
+    @property
+    def enabled(self) -> bool:
+        """Addrmaps without saved registers get no snapshot, an empty one would silently save nothing
+
+        The children of the addrmap are its static members, the snapshot is not generated either if it reuses their names.
+        """
+        children = self.halnode.regs + self.halnode.regfiles + self.halnode.addrmaps + self.halnode.mems
+        return bool(self.slots) and not set(self.names) & set(c.inst_name for c in children)
+
+    def is_saved(self, halreg : HalReg) -> bool:
+        return halreg.has_sw_readable and halreg.has_sw_writable and not halreg.is_read_sensitive
+
+    def is_block(self, halreg : HalReg) -> bool:
+        """Registers accessed with a single access of their width, by the bus"""
+        return halreg.accesswidth == halreg.regwidth and not self.halutils.has_csr(halreg)
+
+    def add_member(self, decl : str, name : str, size : int, alignment : int) -> int:
+        offset = align(self.size, alignment)
+        self.members.append((decl, name, offset))
+        self.size = offset + size
+        self.alignment = max(self.alignment, alignment)
+        return offset
+
+    @staticmethod
+    def indices(dims : 'List[int]') -> 'Iterator[str]':
+        """Subscripts of the elements of an array, in memory order"""
+        for idx in product(*[range(d) for d in dims]):
+            yield "".join(f"[{i}]" for i in idx)
+
+    def add_reg(self, halreg : HalReg):
+        size = halreg.regwidth // 8
+        dims = halreg.array_dimensions if isinstance(halreg, HalArrReg) else []
+        count = 1
+        for d in dims:
+            count *= d
+        offset = self.add_member(f"uint{halreg.regwidth}_t {halreg.inst_name}{''.join(f'[{d}]' for d in dims)};", halreg.inst_name, size * count, size)
+        for i, idx in enumerate(self.indices(dims)):
+            addr = halreg.addr_offset + i * size
+            reg_type = f"{self.ns}::{halreg.type_name.upper()}<0x{addr:x}, {halreg.width}, TYPE>"
+            self.slots.append(Slot(halreg.inst_name + idx, offset + i * size, addr, halreg.regwidth, reg_type, halreg))
+
+    def add_regfile(self, halrf : HalRegfile):
+        regs = sorted([r for r in halrf.regs if self.is_saved(r)], key=lambda r: r.addr_offset)
+        if not regs:
+            return
+
+        type_name = halrf.inst_name + "_snapshot_type"
+        members = []
+        size, alignment = 0, 1
+        for r in regs:
+            reg_size = r.regwidth // 8
+            offset = align(size, reg_size)
+            members.append((f"uint{r.regwidth}_t {r.inst_name};", r.inst_name, offset))
+            size = offset + reg_size
+            alignment = max(alignment, reg_size)
+        size = align(size, alignment)
+        self.types.append((type_name, members, size))
+
+        dims = halrf.array_dimensions if halrf.is_array else []
+        count = 1
+        for d in dims:
+            count *= d
+        offset = self.add_member(f"{type_name} {halrf.inst_name}{''.join(f'[{d}]' for d in dims)};", halrf.inst_name, size * count, alignment)
+        rf_cls = self.halutils.get_extern(halrf).upper()
+        for i, idx in enumerate(self.indices(dims)):
+            rf_addr = halrf.addr_offset + i * (halrf.array_stride if halrf.is_array else 0)
+            rf_type = f"{self.ns}::{rf_cls}<0x{rf_addr:x}, TYPE>"
+            for r, (_, _, r_offset) in zip(regs, members):
+                reg_type = f"{self.ns}::{r.type_name.upper()}<0x{r.addr_offset:x}, {r.width}, {rf_type}>"
+                self.slots.append(Slot(f"{halrf.inst_name}{idx}.{r.inst_name}", offset + i * size + r_offset,
+                                       rf_addr + r.addr_offset, r.regwidth, reg_type, r))
+
+    def runs(self, write : bool) -> 'Iterator[Tuple[Slot, int]]':
+        """First register and count of the blocks, registers accessed alone are blocks of one register"""
+        first, count = None, 0
+        for slot in self.slots:
+            block = self.is_block(slot.halreg) and not (write and slot.halreg.wr_noop_mask)
+            size = slot.regwidth // 8
+            if (first is not None and block and first.regwidth == slot.regwidth
+                    and first.addr + count * size == slot.addr and first.offset + count * size == slot.offset):
+                count += 1
+                continue
+            if first is not None:
+                yield first, count
+            first, count = (slot, 1) if block else (None, 0)
+            if not block:
+                yield slot, 1
+        if first is not None:
+            yield first, count
+
+    def get_layout_asserts(self) -> 'List[str]':
+        """The blocks are copied at the offsets computed here, the compiler must lay out the structs the same"""
+        asserts = []
+        structs = list(self.types)
+        if self.members:
+            structs.append(("snapshot_type", self.members, align(self.size, self.alignment)))
+        for name, members, size in structs:
+            conds = [f"offsetof({name}, {m}) == 0x{offset:x}" for _, m, offset in members] + [f"sizeof({name}) == 0x{size:x}"]
+            asserts.append(f"static_assert({' && '.join(conds)}, \"Unexpected layout of {name}\");")
+        return asserts
+
+    def get_reads(self) -> 'List[str]':
+        lines = []
+        for slot, count in self.runs(write=False):
+            if count == 1:
+                lines.append(f"s.{slot.member} = {slot.reg_type}::get();")
+            else:
+                word = f"uint{slot.regwidth}_t"
+                lines.append(f"halcpp::parent_read_block<TYPE, {word}>(0x{slot.addr:x}, reinterpret_cast<{word} *>(p + 0x{slot.offset:x}), {count});")
+        return lines
+
+    def get_writes(self) -> 'List[str]':
+        lines = []
+        for slot, count in self.runs(write=True):
+            r = slot.halreg
+            if count > 1:
+                word = f"uint{slot.regwidth}_t"
+                lines.append(f"halcpp::parent_write_block<TYPE, {word}>(0x{slot.addr:x}, reinterpret_cast<const {word} *>(p + 0x{slot.offset:x}), {count});")
+            elif r.wr_noop_mask:
+                keep_mask = ((1 << r.regwidth) - 1) & ~r.wr_noop_mask
+                noop_val = f" | 0x{r.wr_noop_val:x}" if r.wr_noop_val else ""
+                lines.append(f"{slot.reg_type}::set((s.{slot.member} & 0x{keep_mask:x}){noop_val});")
+            else:
+                lines.append(f"{slot.reg_type}::set(s.{slot.member});")
+        # The blocks do not go through the registers, the mirrors reload the register on the next write
+        for slot in self.slots:
+            if self.halutils.has_shadow(slot.halreg):
+                lines.append(f"{slot.reg_type}::invalidate();")
+        return lines
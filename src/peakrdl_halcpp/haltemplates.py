@@ -0,0 +1,76 @@
+"""Jinja environment shared by all renders of a process.
+
+The templates can be compiled ahead of time into python modules (done by
+setup.py when building the package), the environment then loads them with
+a ModuleLoader instead of parsing the .j2 files. If the compiled templates
+are missing, or were produced by a different Jinja2 version, the sources
+are parsed once with a FileSystemLoader and cached by the environment.
+
+This module is also loaded by setup.py, so it must not import anything
+from the package.
+"""
+import os
+from typing import Optional
+
+import jinja2
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(__file__), "templates")
+COMPILED_DIR = os.path.join(TEMPLATES_DIR, "compiled")
+VERSION_FILE = "JINJA_VERSION"
+
+_env = None
+
+
+def create_environment(loader: jinja2.BaseLoader) -> jinja2.Environment:
+    env = jinja2.Environment(
+        loader=loader,
+        trim_blocks=True,
+        lstrip_blocks=True,
+        auto_reload=False)
+
+    env.filters.update({
+        'zip' : zip,
+        })
+    return env
+
+
+def compile_templates(target: str = COMPILED_DIR) -> None:
+    """Compile all the templates into python modules placed in target directory"""
+    env = create_environment(jinja2.FileSystemLoader(TEMPLATES_DIR))
+    env.compile_templates(
+        target,
+        extensions=["j2"],
+        zip=None,
+        ignore_errors=False)
+    with open(os.path.join(target, VERSION_FILE), 'w') as f:
+        f.write(jinja2.__version__)
+
+
+def has_compiled_templates(compiled_dir: str = COMPILED_DIR) -> bool:
+    try:
+        with open(os.path.join(compiled_dir, VERSION_FILE)) as f:
+            return f.read().strip() == jinja2.__version__
+    except OSError:
+        return False
+
+
+def get_environment(precompiled: Optional[bool] = None) -> jinja2.Environment:
+    """Return the environment shared per process
+
+    precompiled forces the loader type, by default the compiled templates are
+    used if they are available. Passing it always creates a new environment.
+    """
+    global _env
+    if precompiled is None and _env is not None:
+        return _env
+
+    use_compiled = has_compiled_templates() if precompiled is None else precompiled
+    if use_compiled:
+        loader = jinja2.ModuleLoader(COMPILED_DIR) # type: jinja2.BaseLoader
+    else:
+        loader = jinja2.FileSystemLoader(TEMPLATES_DIR)
+
+    env = create_environment(loader)
+    if precompiled is None:
+        _env = env
+    return env
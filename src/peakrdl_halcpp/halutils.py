@@ -1,14 +1,27 @@
-from typing import List
+from typing import List, Dict
 import getpass
 import datetime
 
 from .haladdrmap import *
+from .halsnapshot import HalSnapshot
 
 class HalUtils():
     def __init__(self,
                  extern : List[str],
+                 deterministic : bool = False,
+                 shadow : 'List[str]|None' = None,
+                 flat_addresses : bool = False,
+                 csr : 'List[str]|None' = None,
                  ) -> None:
         self.extern = extern
+        self.deterministic = deterministic
+        self.shadow = shadow
+        self.flat_addresses = flat_addresses
+        self.csr = csr
+
+    def fingerprint(self) -> str:
+        """Options the headers are rendered with"""
+        return repr((self.extern, self.deterministic, self.shadow, self.flat_addresses, self.csr))
 
     def get_include_file(self, halnode : HalAddrmap) -> str:
         has_extern = self.has_extern(halnode)
@@ -25,22 +38,66 @@ class HalUtils():
             return halnode.orig_type_name
         return halnode.type_name
 
+    def has_shadow(self, halreg : HalReg) -> bool:
+        """Shadow the writable registers whose type name, or containing addrmap type name, is in shadow"""
+        if self.shadow is not None and halreg.has_sw_writable:
+            if halreg.type_name in self.shadow or halreg.get_parent_haladdrmap().orig_type_name in self.shadow:
+                return True
+        return False
+
+    def has_csr(self, halreg : HalReg) -> bool:
+        """Registers of the addrmaps whose type name is in csr are CSRs, accessed with the Zicsr instructions"""
+        if self.csr is not None and halreg.get_parent_haladdrmap().orig_type_name in self.csr:
+            assert isinstance(halreg.parent, HalAddrmap), f"Register {halreg.orig_type_name} of CSR addrmap {halreg.get_parent_haladdrmap().orig_type_name} is in a regfile, CSR addrmaps can only contain registers"
+            return True
+        return False
+
+    def get_reg_base_type(self, halreg : HalReg) -> str:
+        # The register is accessed with the width of its SystemRDL regwidth and accesswidth,
+        # WIDTH only covers its fields
+        widths = f"{halreg.regwidth}"
+        if halreg.accesswidth != halreg.regwidth:
+            widths += f", {halreg.accesswidth}"
+        if self.has_csr(halreg):
+            return f"halcpp::Csr{halreg.cpp_type}<BASE, WIDTH, PARENT_TYPE, {halreg.regwidth}>"
+        if self.has_shadow(halreg):
+            cpp_type = "RegShadowRW" if halreg.has_sw_readable else "RegShadowWO"
+            return f"halcpp::{cpp_type}<BASE, WIDTH, PARENT_TYPE, 0x{halreg.reset:x}, {widths}>"
+        return f"halcpp::{halreg.cpp_type}<BASE, WIDTH, PARENT_TYPE, {widths}>"
+
+    def get_alias_offset(self, halreg : HalReg, kind : str, halregs : 'List[HalReg]') -> 'int|None':
+        """Return the offset of the 'set' or 'clr' alias of halreg, if all the registers of its type have it"""
+        attr = kind + "_alias_offset"
+        offset = getattr(halreg, attr)
+        if offset is None:
+            return None
+        for r in halregs:
+            if r.type_name == halreg.type_name and getattr(r, attr) != offset:
+                return None
+        return offset
+
+    def get_snapshot(self, halnode : HalAddrmap) -> HalSnapshot:
+        return HalSnapshot(halnode, self)
+
     def get_unique_type_nodes(self, lst : 'List[HalBase]'):
         return list({node.type_name: node for node in lst}.values())
 
     def generate_file_header(self):
-        username = getpass.getuser()
-        current_datetime = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         comment = f"// Generated with PeakRD-halcpp : https://github.com/Risto97/PeakRDL-halcpp\n" 
-        comment += f"// By user: {username} at: {current_datetime}\n"
+        if not self.deterministic: # Same input should always give byte-identical output
+            username = getpass.getuser()
+            current_datetime = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            comment += f"// By user: {username} at: {current_datetime}\n"
         return comment
 
     def build_hierarchy(self,
                         node : AddrmapNode,
                         keep_buses   : bool = False,
                         remove_root  : bool = True,
+                        type_cache : 'Dict|None' = None,
+                        enum_registry : 'HalEnumRegistry|None' = None,
                         ) -> HalAddrmap:
-        top = HalAddrmap(node)
+        top = HalAddrmap(node, type_cache=type_cache, enum_registry=enum_registry)
 
         # if remove_root:               # TODO check this
         #     addrmaps.remove(node)
@@ -0,0 +1,100 @@
+from typing import Callable, Dict, List, Optional, TextIO
+import os
+import sys
+import time
+import traceback
+
+from systemrdl import RDLCompileError
+from systemrdl.node import AddrmapNode
+
+from .exporter import HalExporter
+
+class HalWatcher():
+    """Export the HAL again whenever one of its source files changes
+
+    The RDL is compiled and elaborated again on every change, the compiler cannot update an
+    elaborated design, but the same incremental HalExporter is used for all the exports, so only
+    the headers of the addrmaps whose content changed are rendered and written.
+
+        watcher = HalWatcher(
+                elaborate=lambda: compile_and_elaborate(files),
+                export=lambda hal, top: hal.export(top, "out", deterministic=True),
+                input_files=files,
+                )
+        watcher.run()
+
+    The files are polled every interval seconds, the watched files are input_files
+    and every file the components of the last elaborated design were described in.
+    """
+    def __init__(self,
+                 elaborate : 'Callable[[], AddrmapNode|List[AddrmapNode]]',
+                 export : 'Callable[[HalExporter, AddrmapNode|List[AddrmapNode]], None]',
+                 input_files : 'List[str]',
+                 interval : float = 0.5,
+                 log : 'Optional[TextIO]' = None,
+                 ) -> None:
+        self.elaborate = elaborate
+        self.export = export
+        self.input_files = list(input_files)
+        self.interval = interval
+        self.log = log if log is not None else sys.stderr
+
+        self.exporter = HalExporter(incremental=True)
+        self.sources = list(self.input_files)
+        self.mtimes = {} # type: Dict[str, Optional[int]]
+
+    def get_mtimes(self, files : 'List[str]') -> 'Dict[str, Optional[int]]':
+        mtimes = {}
+        for f in files:
+            try:
+                mtimes[f] = os.stat(f).st_mtime_ns
+            except OSError: # Deleted, or being replaced by an editor
+                mtimes[f] = None
+        return mtimes
+
+    def build(self) -> bool:
+        """Elaborate and export the design, returns False if it failed"""
+        start = time.perf_counter()
+        # Taken before compiling, the changes made during the export trigger another one
+        self.mtimes = self.get_mtimes(self.sources)
+        try:
+            top = self.elaborate()
+            nodes = top if isinstance(top, list) else [top]
+            self.sources = sorted(set(self.input_files).union(*(self.exporter.get_source_files(n) for n in nodes)))
+            self.mtimes.update({f: m for f, m in self.get_mtimes(self.sources).items() if f not in self.mtimes})
+            self.export(self.exporter, top)
+        except RDLCompileError: # The compiler already printed the errors
+            print("Compilation failed, waiting for changes", file=self.log)
+            return False
+        except Exception:
+            traceback.print_exc(file=self.log)
+            print("Export failed, waiting for changes", file=self.log)
+            return False
+        print(f"Exported in {time.perf_counter() - start:.2f}s, {len(self.exporter.rendered)} addrmap headers regenerated", file=self.log)
+        return True
+
+    def changed_files(self) -> 'List[str]':
+        mtimes = self.get_mtimes(self.sources)
+        return [f for f, m in mtimes.items() if m != self.mtimes.get(f)]
+
+    def wait_for_change(self) -> 'List[str]':
+        while True:
+            changed = self.changed_files()
+            if changed:
+                return changed
+            time.sleep(self.interval)
+
+    def run(self, max_builds : 'Optional[int]' = None):
+        """Export, then export again after every change, until interrupted or max_builds exports"""
+        builds = 0
+        try:
+            while True:
+                self.build()
+                builds += 1
+                if max_builds is not None and builds >= max_builds:
+                    return
+                print("Watching " + ", ".join(self.sources), file=self.log)
+                changed = self.wait_for_change()
+                print("Changed " + ", ".join(changed), file=self.log)
+        except KeyboardInterrupt:
+            pass
@@ -2,35 +2,88 @@
 #define _ADDRMAP_NODE_H_
 
 #include "arch_io.h"
+#include "halcpp_utils.h"
 #include <cstdint>
+#include <type_traits>
 
 // TODO define architecture type size, so it replaces uint32_t
 
-template <uint32_t BASE, typename PARENT_TYPE = void>
+/* IO_TYPE is the IO backend of the top addrmap, see the specialization below */
+template <uint32_t BASE, typename PARENT_TYPE = void, typename IO_TYPE = ArchIoNode>
 class AddrmapNode {
 public:
     static constexpr uint32_t get_abs_addr() { return PARENT_TYPE().get_abs_addr() + BASE; }
 
-    static inline uint32_t get(const uint32_t addr) { return PARENT_TYPE::get(addr + BASE); }
-    static inline void set(const uint32_t addr, uint32_t val) {
-        PARENT_TYPE::set(addr + BASE, val);
+    template <typename T = uint32_t>
+    static inline T get(const uint32_t addr) { return PARENT_TYPE::template get<T>(addr + BASE); }
+    template <typename T = uint32_t>
+    static inline void set(const uint32_t addr, T val) {
+        PARENT_TYPE::template set<T>(addr + BASE, val);
+    }
+
+    // Block of n consecutive T at addr
+    template <typename T>
+    static inline void get_block(const uint32_t addr, T *dst, uint32_t n) {
+        PARENT_TYPE::template get_block<T>(addr + BASE, dst, n);
+    }
+    template <typename T>
+    static inline void set_block(const uint32_t addr, const T *src, uint32_t n) {
+        PARENT_TYPE::template set_block<T>(addr + BASE, src, n);
     }
 };
 
 /* Specialization for the Top hierarchy addrmap
  *  Top node does not have a parent.
- *  Insted it inherits ArchIoNode, that implements memory access for architecture
+ *  Insted it inherits IO_TYPE, that implements memory access for architecture,
+ *  ArchIoNode by default, or a host backend of host_io.h
  */
-template <uint32_t BASE>
-class AddrmapNode <BASE, void> : public ArchIoNode {
+template <uint32_t BASE, typename IO_TYPE>
+class AddrmapNode <BASE, void, IO_TYPE> : public IO_TYPE {
 public:
 
     static constexpr uint32_t get_abs_addr() { return BASE; }
 
-    static inline void set(uint32_t addr, uint32_t val) {
-        ArchIoNode::write32(addr + BASE, val);
+    template <typename T = uint32_t>
+    static inline void set(uint32_t addr, T val) {
+        halcpp::io_write<IO_TYPE, T>(addr + BASE, val);
+    }
+    template <typename T = uint32_t>
+    static inline T get(uint32_t addr) { return halcpp::io_read<IO_TYPE, T>(addr + BASE); }
+
+    template <typename T>
+    static inline void get_block(uint32_t addr, T *dst, uint32_t n) {
+        halcpp::io_read_block<IO_TYPE, T>(addr + BASE, dst, n);
+    }
+    template <typename T>
+    static inline void set_block(uint32_t addr, const T *src, uint32_t n) {
+        halcpp::io_write_block<IO_TYPE, T>(addr + BASE, src, n);
     }
-    static inline uint32_t get(uint32_t addr) { return ArchIoNode::read32(addr + BASE); }
 };
 
+namespace halcpp {
+
+/* Absolute address and IO class of the parent, used by the nodes exported with flat addresses
+ *  to define their abs_base and io_type. The top addrmap has no parent and uses its IO_TYPE.
+ */
+template <typename PARENT_TYPE>
+constexpr uint32_t parent_abs_base() {
+    if constexpr (std::is_void_v<PARENT_TYPE>)
+        return 0;
+    else if constexpr (node_is_flat_v<PARENT_TYPE>)
+        return PARENT_TYPE::abs_base;
+    else
+        return PARENT_TYPE::get_abs_addr();
+}
+
+template <typename PARENT_TYPE, typename IO_TYPE = ArchIoNode>
+struct parent_io { using type = typename PARENT_TYPE::io_type; };
+
+template <typename IO_TYPE>
+struct parent_io<void, IO_TYPE> { using type = IO_TYPE; };
+
+template <typename PARENT_TYPE, typename IO_TYPE = ArchIoNode>
+using parent_io_t = typename parent_io<PARENT_TYPE, IO_TYPE>::type;
+
+}
+
 #endif // !_ADDRMAP_NODE_H_
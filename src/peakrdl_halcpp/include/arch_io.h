@@ -6,8 +6,14 @@
 
 class MemIoNode {
 public:
-    static inline uint32_t read32(uint32_t addr) { return *(volatile uint32_t*)addr; }
-    static inline void write32(uint32_t addr, uint32_t val) { *(volatile uint32_t*)addr = val; }
+    /* Access of the width of T, registers access the bus with the width of their type */
+    template <typename T>
+    static inline T read(uint32_t addr) { return *(volatile T*)addr; }
+    template <typename T>
+    static inline void write(uint32_t addr, T val) { *(volatile T*)addr = val; }
+
+    static inline uint32_t read32(uint32_t addr) { return read<uint32_t>(addr); }
+    static inline void write32(uint32_t addr, uint32_t val) { write<uint32_t>(addr, val); }
 
 };
 
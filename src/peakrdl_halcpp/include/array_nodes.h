@@ -35,6 +35,43 @@ constexpr bool valid_index( int32_t I, uint32_t E )
     return  I >= -1 and I < static_cast<int32_t>(E);
 }
 
+/* Register at an address computed at runtime, an element of a register array or of a regfile array
+ *  REG is the type of one of the registers, that does the bus accesses of its width,
+ *  addr is relative to PARENT_TYPE, the parent of REG. The whole register is read or written.
+ */
+template <typename REG, typename PARENT_TYPE>
+class RegRef {
+public:
+    using dataType = uint_t<REG::regwidth>;
+
+    constexpr explicit RegRef(const uint32_t addr) : addr(addr) {
+        static_assert(!node_is_csr_v<REG>, "The CSR number is encoded in the instruction, select CSRs with at<>()");
+        static_assert(!node_has_shadow_v<REG>, "The mirrors of shadow registers are per element, select them with at<>()");
+    }
+
+    inline dataType get() const {
+        static_assert(node_has_get_v<REG>, "Register is not readable");
+        return REG::bus_read(addr);
+    }
+
+    inline void set(const dataType val) const {
+        static_assert(node_has_set_v<REG>, "Register is not writable");
+        REG::bus_write(addr, val);
+    }
+
+    // Value type of the register, with an accessor per readable field
+    template <typename R = REG>
+    inline typename R::value_type read() const { return typename R::value_type(get()); }
+
+    inline operator dataType() const { return get(); }
+    inline const RegRef &operator=(const dataType val) const { set(val); return *this; }
+
+    constexpr uint32_t get_abs_addr() const { return PARENT_TYPE().get_abs_addr() + addr; }
+
+private:
+    uint32_t addr;
+};
+
 template< 
     template<uint32_t B, uint32_t W, typename P> typename REG_T,
     uint32_t BASE, uint32_t WIDTH, uint32_t STRIDE, typename PARENT_TYPE, uint32_t ... Extents
@@ -44,10 +81,17 @@ class  RegArrayNode
 private:
     static constexpr uint32_t Dimensions = sizeof...(Extents);
     static_assert( Dimensions > 0 );
+    // First element, that does the bus accesses of all the elements
+    using reg_type = REG_T< BASE, WIDTH, PARENT_TYPE >;
+    static constexpr bool contiguous = STRIDE == reg_type::regwidth / 8 && reg_type::accesswidth == reg_type::regwidth;
+
 public :
     static constexpr uint32_t stride = STRIDE;
+    static constexpr uint32_t size = ( Extents * ... );
     static_assert( Dimensions > 0 );
 
+    using dataType = typename RegRef<reg_type, PARENT_TYPE>::dataType;
+
     template<int32_t ... Indices>
     auto at()
     {
@@ -58,6 +102,47 @@ public :
         return REG_T< offset, WIDTH, PARENT_TYPE >();
     }
 
+    /* Runtime indexed element, at BASE + linear index * STRIDE
+     *  The indices are not checked, the register is accessed as a whole.
+     */
+    template<typename ... Indices>
+    inline RegRef<reg_type, PARENT_TYPE> at(const Indices ... indices) const
+    {
+        static_assert( sizeof...(Indices) == Dimensions );
+        return RegRef<reg_type, PARENT_TYPE>( BASE + linear_index<STRIDE>( std::array<uint32_t, Dimensions>{ static_cast<uint32_t>(indices) ... }, std::array{ Extents ... } ) );
+    }
+
+    inline RegRef<reg_type, PARENT_TYPE> operator[](const uint32_t index) const
+    {
+        static_assert( Dimensions == 1, "Use at(i, j, ...) for multidimensional arrays" );
+        return RegRef<reg_type, PARENT_TYPE>( BASE + index * STRIDE );
+    }
+
+    /* Read or write count consecutive elements, starting from the element of linear index first
+     *  Arrays of registers accessed with a single access of their width are passed as a block to the IO class.
+     */
+    static inline void read_block(const uint32_t first, dataType *dst, const uint32_t count)
+    {
+        static_assert(!node_is_csr_v<reg_type>, "The CSR number is encoded in the instruction, select CSRs with at<>()");
+        static_assert(!node_has_shadow_v<reg_type>, "The mirrors of shadow registers are per element, select them with at<>()");
+        if constexpr (contiguous)
+            parent_read_block<PARENT_TYPE, dataType>(BASE + first * STRIDE, dst, count);
+        else
+            for (uint32_t i = 0; i < count; i++)
+                dst[i] = reg_type::bus_read(BASE + (first + i) * STRIDE);
+    }
+
+    static inline void write_block(const uint32_t first, const dataType *src, const uint32_t count)
+    {
+        static_assert(!node_is_csr_v<reg_type>, "The CSR number is encoded in the instruction, select CSRs with at<>()");
+        static_assert(!node_has_shadow_v<reg_type>, "The mirrors of shadow registers are per element, select them with at<>()");
+        if constexpr (contiguous)
+            parent_write_block<PARENT_TYPE, dataType>(BASE + first * STRIDE, src, count);
+        else
+            for (uint32_t i = 0; i < count; i++)
+                reg_type::bus_write(BASE + (first + i) * STRIDE, src[i]);
+    }
+
     template<uint32_t IDX>
     constexpr uint32_t get_dim(){
         static_assert(IDX < Dimensions, "Index out of bounds");
@@ -67,6 +152,28 @@ public :
     }
 };
 
+/* Regfile at an address computed at runtime, an element of a regfile array
+ *  Its registers are selected with a register of the first element, offset is the offset
+ *  from the first element:
+ *      auto ch0 = soc.dma.CH.at<0>();
+ *      soc.dma.CH[i][ch0.CTRL] = 1;
+ */
+template <typename REGFILE, typename PARENT_TYPE>
+class RegfileRef {
+public:
+    constexpr explicit RegfileRef(const uint32_t offset) : offset(offset) {}
+
+    template <typename REG>
+    inline RegRef<REG, REGFILE> operator[]([[maybe_unused]] const REG &reg) const {
+        return RegRef<REG, REGFILE>( REG::get_abs_addr() - REGFILE::get_abs_addr() + offset );
+    }
+
+    constexpr uint32_t get_abs_addr() const { return REGFILE::get_abs_addr() + offset; }
+
+private:
+    uint32_t offset;
+};
+
 template< 
     template<uint32_t B, typename P> typename REGFILE_T,
     uint32_t BASE, uint32_t STRIDE, typename PARENT_TYPE, uint32_t ... Extents
@@ -89,6 +196,20 @@ public :
         return REGFILE_T< offset, PARENT_TYPE >();
     }
 
+    // Runtime indexed element, at BASE + linear index * STRIDE, the indices are not checked
+    template<typename ... Indices>
+    inline RegfileRef<REGFILE_T< BASE, PARENT_TYPE >, PARENT_TYPE> at(const Indices ... indices) const
+    {
+        static_assert( sizeof...(Indices) == Dimensions );
+        return RegfileRef<REGFILE_T< BASE, PARENT_TYPE >, PARENT_TYPE>( linear_index<STRIDE>( std::array<uint32_t, Dimensions>{ static_cast<uint32_t>(indices) ... }, std::array{ Extents ... } ) );
+    }
+
+    inline RegfileRef<REGFILE_T< BASE, PARENT_TYPE >, PARENT_TYPE> operator[](const uint32_t index) const
+    {
+        static_assert( Dimensions == 1, "Use at(i, j, ...) for multidimensional arrays" );
+        return RegfileRef<REGFILE_T< BASE, PARENT_TYPE >, PARENT_TYPE>( index * STRIDE );
+    }
+
     template<uint32_t IDX>
     constexpr uint32_t get_dim(){
         static_assert(IDX < Dimensions, "Index out of bounds");
@@ -0,0 +1,103 @@
+#ifndef _CSR_REG_NODE_H_
+#define _CSR_REG_NODE_H_
+
+#include <stdint.h>
+#include <type_traits>
+#include "halcpp_utils.h"
+#include "reg_node.h"
+
+/* Instructions of the RISC-V Zicsr extension, csr is the CSR number, a compile time constant
+ *  Define them before including the HAL to run it elsewhere, host_io.h defines them to a mock CSR file.
+ */
+#if !defined(HALCPP_CSRR) && defined(__riscv)
+#define HALCPP_CSRR(csr, val) __asm__ volatile ("csrr %0, %1" : "=r"(val) : "i"(csr))
+#define HALCPP_CSRW(csr, val) __asm__ volatile ("csrw %0, %1" : : "i"(csr), "r"(val))
+#define HALCPP_CSRS(csr, val) __asm__ volatile ("csrs %0, %1" : : "i"(csr), "r"(val))
+#define HALCPP_CSRC(csr, val) __asm__ volatile ("csrc %0, %1" : : "i"(csr), "r"(val))
+#elif !defined(HALCPP_CSRR)
+// Only fails when a CSR register is accessed, the HALs without CSRs still compile on any target
+#define HALCPP_CSR_UNAVAILABLE(csr, val) \
+    static_assert((csr) != (csr), "No CSR instructions for this target, include host_io.h before the HAL to use the mock CSR file"); (void)(val)
+#define HALCPP_CSRR(csr, val) HALCPP_CSR_UNAVAILABLE(csr, val = 0)
+#define HALCPP_CSRW(csr, val) HALCPP_CSR_UNAVAILABLE(csr, val)
+#define HALCPP_CSRS(csr, val) HALCPP_CSR_UNAVAILABLE(csr, val)
+#define HALCPP_CSRC(csr, val) HALCPP_CSR_UNAVAILABLE(csr, val)
+#endif
+
+namespace halcpp{
+
+/* Access of the CSRs with csrr, csrw, csrs and csrc, the CSR number is a template parameter
+ *  T is the register type, it must not be wider than XLEN.
+ */
+class CsrIoNode {
+public:
+    template <uint32_t CSR, typename T>
+    static inline T read() {
+        unsigned long val;
+        HALCPP_CSRR(CSR, val);
+        return static_cast<T>(val);
+    }
+
+    template <uint32_t CSR, typename T>
+    static inline void write(T val) {
+        HALCPP_CSRW(CSR, static_cast<unsigned long>(val));
+    }
+
+    template <uint32_t CSR, typename T>
+    static inline void set_bits(T bits) {
+        HALCPP_CSRS(CSR, static_cast<unsigned long>(bits));
+    }
+
+    template <uint32_t CSR, typename T>
+    static inline void clear_bits(T bits) {
+        HALCPP_CSRC(CSR, static_cast<unsigned long>(bits));
+    }
+};
+
+/* Register of an addrmap exported as CSRs, accessed with the Zicsr instructions instead of the bus
+ *  The CSR number is BASE divided by the size of the register, the offset of the register in its
+ *  addrmap. The number is encoded in the instructions, the registers of CSR arrays can only be
+ *  selected with at<>(), not with runtime indices.
+ */
+template <uint32_t BASE, uint32_t WIDTH, typename PARENT_TYPE, uint32_t REGWIDTH = 0>
+class CsrRegBase : public RegBase<BASE, WIDTH, PARENT_TYPE, REGWIDTH> {
+private:
+    using base = RegBase<BASE, WIDTH, PARENT_TYPE, REGWIDTH>;
+    using wordType = typename base::wordType;
+
+public:
+    static constexpr uint32_t csr_num = BASE / (base::regwidth / 8);
+    static_assert(BASE % (base::regwidth / 8) == 0, "CSR offset is not a multiple of the register size");
+    static_assert(csr_num < 4096, "CSR number is out of the 12-bit CSR space");
+
+    // addr is always rel_base, runtime indexed registers are rejected by RegRef
+    static inline wordType bus_read([[maybe_unused]] const uint32_t addr) {
+        return CsrIoNode::read<csr_num, wordType>();
+    }
+
+    static inline void bus_write([[maybe_unused]] const uint32_t addr, wordType val) {
+        CsrIoNode::write<csr_num, wordType>(val);
+    }
+
+    // Single csrs and csrc instructions, the other bits of the register are written back unchanged
+    static inline void set_bits(wordType bits) {
+        CsrIoNode::set_bits<csr_num, wordType>(bits);
+    }
+
+    static inline void clear_bits(wordType bits) {
+        CsrIoNode::clear_bits<csr_num, wordType>(bits);
+    }
+};
+
+template <uint32_t BASE, uint32_t WIDTH, typename PARENT_TYPE, uint32_t REGWIDTH = 0>
+using CsrRegRO = RegNode<RegRdMixin< CsrRegBase< BASE, WIDTH, PARENT_TYPE, REGWIDTH> > >;
+
+template <uint32_t BASE, uint32_t WIDTH, typename PARENT_TYPE, uint32_t REGWIDTH = 0>
+using CsrRegWO = RegNode<RegWrMixin< CsrRegBase< BASE, WIDTH, PARENT_TYPE, REGWIDTH> > >;
+
+template <uint32_t BASE, uint32_t WIDTH, typename PARENT_TYPE, uint32_t REGWIDTH = 0>
+using CsrRegRW = RegNode<RegWrMixin< CsrRegBase< BASE, WIDTH, PARENT_TYPE, REGWIDTH> >, RegRdMixin< CsrRegBase< BASE, WIDTH, PARENT_TYPE, REGWIDTH> >  >;
+
+}
+
+#endif // !_CSR_REG_NODE_H_
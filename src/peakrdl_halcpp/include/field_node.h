@@ -19,31 +19,68 @@ protected:
     static constexpr uint32_t start_bit = START_BIT;
     static constexpr uint32_t end_bit = END_BIT;
     static constexpr uint32_t width = END_BIT-START_BIT+1;
-    using dataType =
-        typename std::conditional<width  <= 8, uint8_t,
-                                  typename std::conditional<width <= 16,
-                                                            uint16_t, uint32_t>::type>::type;
+    using dataType = uint_t<width>;
 
-    static constexpr uint32_t calc_mask() {
-        static_assert(width <= 32, "Register cannot be bigger than 32 bits");
-        return (~0u) ^ (((1u << (width)) - 1) << START_BIT);
+    // Bits of the register outside of the field, of the mask type of the register
+    static constexpr auto calc_mask() {
+        using word = reg_word_t<PARENT_TYPE>;
+        static_assert(END_BIT < 8 * sizeof(word), "Field is outside of the register");
+        return static_cast<word>(~(static_cast<word>(field_mask()) << START_BIT));
     }
-    static constexpr uint32_t field_mask() {
-        return (((1u << (width)) - 1));
+    static constexpr dataType field_mask() {
+        return static_cast<dataType>(width >= 64 ? ~0ull : ((1ull << width) - 1));
     }
 };
 
+/* Value of a field, to be written together with other fields of the register with RegNode::modify()
+ *  The mask is known at compile time, val is already shifted to the field position.
+ */
+template <uint32_t START_BIT, uint32_t WIDTH, typename PARENT_TYPE>
+class FieldValue {
+public:
+    using parent_type = PARENT_TYPE;
+    using word = reg_word_t<PARENT_TYPE>;
+    static constexpr word mask = static_cast<word>(WIDTH >= 64 ? ~0ull : ((1ull << WIDTH) - 1)) << START_BIT;
+
+    word val;
+};
+
 template <typename BASE_TYPE>
 class FieldWrMixin : public BASE_TYPE {
 public:
     using parent = typename BASE_TYPE::parent_type;
     static constexpr bool has_set() { return true; };
 
+    /* The other fields are read and written back, unless they are all covered by fields with write
+     *  side effects, that are always given their no-op value, the field is then written without a read.
+     *  CSR fields are written with a single csrs or csrc for 1-bit fields, csrc then csrs otherwise,
+     *  skipping the one without bits to change, unless the CSR has fields with write side effects,
+     *  that csrs and csrc would write back.
+     */
     static inline void set(typename BASE_TYPE::dataType val) {
-        if constexpr (node_has_get_v<parent>)
-            parent::set((parent::get() & BASE_TYPE::calc_mask()) | ((val & BASE_TYPE::field_mask()) << BASE_TYPE::start_bit));
+        using word = reg_word_t<parent>;
+        constexpr word keep_mask = reg_sw_wr_mask<parent>::value & ~reg_wr_noop_mask<parent>::value & BASE_TYPE::calc_mask();
+        constexpr word noop_val = reg_wr_noop_val<parent>::value & BASE_TYPE::calc_mask();
+        const word field_val = (static_cast<word>(val & BASE_TYPE::field_mask()) << BASE_TYPE::start_bit) | noop_val;
+
+        if constexpr (keep_mask == 0)
+            parent::set(field_val);
+        else if constexpr (node_is_csr_v<parent> && reg_wr_noop_mask<parent>::value == 0) {
+            constexpr word mask = ~BASE_TYPE::calc_mask();
+            if constexpr (BASE_TYPE::width == 1) {
+                if (val & 1) parent::set_bits(mask);
+                else parent::clear_bits(mask);
+            } else {
+                if ((mask & ~field_val) != 0) parent::clear_bits(mask & ~field_val);
+                if (field_val != 0) parent::set_bits(field_val);
+            }
+        }
+        else if constexpr (node_has_shadow_v<parent>)
+            parent::set((parent::get_shadow() & keep_mask) | field_val);
+        else if constexpr (node_has_get_v<parent>)
+            parent::set((parent::get() & keep_mask) | field_val);
         else
-            parent::set(val << BASE_TYPE::start_bit);
+            parent::set(field_val);
     }
 
     template<uint32_t CONST_WIDTH, uint32_t CONST_VAL>
@@ -52,6 +89,18 @@ public:
         set((typename BASE_TYPE::dataType) a.val);
     }
 
+    using value_type = FieldValue<BASE_TYPE::start_bit, BASE_TYPE::width, parent>;
+
+    inline value_type operator()(typename BASE_TYPE::dataType val) const {
+        return value_type{static_cast<typename value_type::word>(val & BASE_TYPE::field_mask()) << BASE_TYPE::start_bit};
+    }
+
+    template<uint32_t CONST_WIDTH, uint32_t CONST_VAL>
+    inline value_type operator()([[maybe_unused]] const Const<CONST_WIDTH, CONST_VAL> &a) const {
+        static_assert(CONST_WIDTH == BASE_TYPE::width, "Constant is not the same width as field");
+        return value_type{static_cast<typename value_type::word>(CONST_VAL) << BASE_TYPE::start_bit};
+    }
+
     // Dont bother with operator= equal as its going to be overriden by inherited class anyways
 };
 
@@ -77,6 +126,42 @@ public:
     }
 };
 
+/* Write mixins of the fields with a write side effect, SystemRDL onwrite and singlepulse
+ *  ONE is the value of the bits that trigger the action, true for woclr, woset and wot,
+ *  false for wzc, wzs and wzt. Their writes only act on the given bits.
+ */
+template <typename BASE_TYPE, bool ONE>
+class FieldClrMixin : public FieldWrMixin<BASE_TYPE> {
+public:
+    static inline void clear(typename BASE_TYPE::dataType bits = BASE_TYPE::field_mask()) {
+        FieldWrMixin<BASE_TYPE>::set(ONE ? bits : ~bits);
+    }
+};
+
+template <typename BASE_TYPE, bool ONE>
+class FieldSetMixin : public FieldWrMixin<BASE_TYPE> {
+public:
+    static inline void set_bits(typename BASE_TYPE::dataType bits = BASE_TYPE::field_mask()) {
+        FieldWrMixin<BASE_TYPE>::set(ONE ? bits : ~bits);
+    }
+};
+
+template <typename BASE_TYPE, bool ONE>
+class FieldToggleMixin : public FieldWrMixin<BASE_TYPE> {
+public:
+    static inline void toggle(typename BASE_TYPE::dataType bits = BASE_TYPE::field_mask()) {
+        FieldWrMixin<BASE_TYPE>::set(ONE ? bits : ~bits);
+    }
+};
+
+template <typename BASE_TYPE>
+class FieldPulseMixin : public FieldWrMixin<BASE_TYPE> {
+public:
+    static inline void pulse() {
+        FieldWrMixin<BASE_TYPE>::set(BASE_TYPE::field_mask());
+    }
+};
+
 // TODO merge this with RegNode ???
 template <typename... FieldMixins>
 class FieldNode : public FieldMixins... {
@@ -133,6 +218,30 @@ using FieldWO = FieldNode<FieldWrMixin< FieldBase< START_BIT, END_BIT, PARENT_TY
 template <uint32_t START_BIT, uint32_t END_BIT, typename PARENT_TYPE>
 using FieldRW = FieldNode<FieldWrMixin< FieldBase< START_BIT, END_BIT, PARENT_TYPE> >, FieldRdMixin< FieldBase< START_BIT, END_BIT, PARENT_TYPE> >  >;
 
+template <typename WR_MIXIN, typename BASE_TYPE, bool READABLE>
+using FieldKind = typename std::conditional<READABLE, FieldNode<WR_MIXIN, FieldRdMixin<BASE_TYPE> >, FieldNode<WR_MIXIN> >::type;
+
+template <uint32_t START_BIT, uint32_t END_BIT, typename PARENT_TYPE, bool READABLE = true>
+using FieldW1C = FieldKind<FieldClrMixin< FieldBase< START_BIT, END_BIT, PARENT_TYPE>, true>, FieldBase< START_BIT, END_BIT, PARENT_TYPE>, READABLE>;
+
+template <uint32_t START_BIT, uint32_t END_BIT, typename PARENT_TYPE, bool READABLE = true>
+using FieldW0C = FieldKind<FieldClrMixin< FieldBase< START_BIT, END_BIT, PARENT_TYPE>, false>, FieldBase< START_BIT, END_BIT, PARENT_TYPE>, READABLE>;
+
+template <uint32_t START_BIT, uint32_t END_BIT, typename PARENT_TYPE, bool READABLE = true>
+using FieldW1S = FieldKind<FieldSetMixin< FieldBase< START_BIT, END_BIT, PARENT_TYPE>, true>, FieldBase< START_BIT, END_BIT, PARENT_TYPE>, READABLE>;
+
+template <uint32_t START_BIT, uint32_t END_BIT, typename PARENT_TYPE, bool READABLE = true>
+using FieldW0S = FieldKind<FieldSetMixin< FieldBase< START_BIT, END_BIT, PARENT_TYPE>, false>, FieldBase< START_BIT, END_BIT, PARENT_TYPE>, READABLE>;
+
+template <uint32_t START_BIT, uint32_t END_BIT, typename PARENT_TYPE, bool READABLE = true>
+using FieldW1T = FieldKind<FieldToggleMixin< FieldBase< START_BIT, END_BIT, PARENT_TYPE>, true>, FieldBase< START_BIT, END_BIT, PARENT_TYPE>, READABLE>;
+
+template <uint32_t START_BIT, uint32_t END_BIT, typename PARENT_TYPE, bool READABLE = true>
+using FieldW0T = FieldKind<FieldToggleMixin< FieldBase< START_BIT, END_BIT, PARENT_TYPE>, false>, FieldBase< START_BIT, END_BIT, PARENT_TYPE>, READABLE>;
+
+template <uint32_t START_BIT, uint32_t END_BIT, typename PARENT_TYPE, bool READABLE = true>
+using FieldPulse = FieldKind<FieldPulseMixin< FieldBase< START_BIT, END_BIT, PARENT_TYPE> >, FieldBase< START_BIT, END_BIT, PARENT_TYPE>, READABLE>;
+
 }
 
 #endif
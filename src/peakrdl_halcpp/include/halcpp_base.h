@@ -5,20 +5,60 @@
 #include <type_traits>
 #include "field_node.h"
 #include "reg_node.h"
+#include "csr_reg_node.h"
 #include "regfile_node.h"
 #include "array_nodes.h"
 #include "addrmap_node.h"
 
 
-template <uint32_t BASE, uint32_t SIZE, typename PARENT_TYPE>
+/* SystemRDL mem, of SIZE bytes with entries of MEMWIDTH bits
+ *  get() and set() access 32 bits at a byte offset, the entries are accessed with their width
+ *  with operator[], or as blocks passed to the IO class with read_block() and write_block().
+ */
+template <uint32_t BASE, uint32_t SIZE, typename PARENT_TYPE, uint32_t MEMWIDTH = 32>
 class MemNode {
 public:
+    using dataType = halcpp::uint_t<MEMWIDTH>;
 
     static constexpr uint32_t base = BASE;
     static constexpr uint32_t size = SIZE;
+    static constexpr uint32_t memwidth = MEMWIDTH;
+    static constexpr uint32_t entries = SIZE / sizeof(dataType);
+
+    // Entry at an index computed at runtime, the index is not checked
+    class Entry {
+    public:
+        constexpr explicit Entry(const uint32_t addr) : addr(addr) {}
+
+        inline dataType get() const { return halcpp::parent_read<PARENT_TYPE, dataType>(addr); }
+        inline void set(const dataType val) const { halcpp::parent_write<PARENT_TYPE, dataType>(addr, val); }
+
+        inline operator dataType() const { return get(); }
+        inline const Entry &operator=(const dataType val) const { set(val); return *this; }
+
+        constexpr uint32_t get_abs_addr() const { return PARENT_TYPE().get_abs_addr() + addr; }
+
+    private:
+        uint32_t addr;
+    };
+
+    inline uint32_t get(const uint32_t addr) {
+        return halcpp::parent_read<PARENT_TYPE, uint32_t>(addr + BASE);
+    }
+    inline void set(const uint32_t addr, uint32_t val) {
+        halcpp::parent_write<PARENT_TYPE, uint32_t>(addr + BASE, val);
+    }
+
+    inline Entry operator[](const uint32_t index) const { return Entry(BASE + index * sizeof(dataType)); }
+
+    // Read or write count consecutive entries, starting from the entry first
+    static inline void read_block(const uint32_t first, dataType *dst, const uint32_t count) {
+        halcpp::parent_read_block<PARENT_TYPE, dataType>(BASE + first * sizeof(dataType), dst, count);
+    }
+    static inline void write_block(const uint32_t first, const dataType *src, const uint32_t count) {
+        halcpp::parent_write_block<PARENT_TYPE, dataType>(BASE + first * sizeof(dataType), src, count);
+    }
 
-    inline uint32_t get(const uint32_t addr) { return PARENT_TYPE::get(addr + BASE); }
-    inline void set(const uint32_t addr, uint32_t val) { PARENT_TYPE::set(addr + BASE, val); }
     static constexpr uint32_t get_abs_addr() { return PARENT_TYPE().get_abs_addr() + BASE; }
     constexpr uint32_t get_size() { return SIZE; }
 };
@@ -6,6 +6,14 @@
 
 namespace halcpp {
 
+/* Smallest unsigned integer type of at least WIDTH bits */
+template <uint32_t WIDTH>
+using uint_t =
+    typename std::conditional<WIDTH <= 8, uint8_t,
+                              typename std::conditional<WIDTH <= 16, uint16_t,
+                                                        typename std::conditional<WIDTH <= 32,
+                                                                                  uint32_t, uint64_t>::type>::type>::type;
+
 template<uint32_t WIDTH, uint32_t VAL>
 class Const{
 public:
@@ -44,6 +52,181 @@ struct node_has_get<LIB,
 
 template <class LIB>
 constexpr bool node_has_get_v = node_has_get<LIB>::value;
+
+template <class LIB, class = void>
+struct node_has_shadow : std::false_type {};
+
+template <class LIB>
+struct node_has_shadow<LIB,
+                    std::enable_if_t<std::is_invocable_r<bool, decltype(LIB::has_shadow)>::value>>
+    : std::integral_constant<bool, LIB::has_shadow()> {};
+
+template <class LIB>
+constexpr bool node_has_shadow_v = node_has_shadow<LIB>::value;
+
+/* Addrmaps and regfiles exported with flat addresses expose abs_base, their absolute address,
+ *  and io_type, the IO class of the top addrmap. Their registers then access the bus directly
+ *  at their absolute address, instead of passing the access through every parent node.
+ */
+template <class NODE, class = void>
+struct node_is_flat : std::false_type {};
+
+template <class NODE>
+struct node_is_flat<NODE, std::void_t<decltype(NODE::abs_base), typename NODE::io_type>> : std::true_type {};
+
+template <class NODE>
+constexpr bool node_is_flat_v = node_is_flat<NODE>::value;
+
+/* Registers of the addrmaps exported as CSRs expose csr_num, the CSR number they are accessed with
+ *  Their whole value is only read and written with csrr and csrw, bits are set and cleared with csrs and csrc.
+ */
+template <class NODE, class = void>
+struct node_is_csr : std::false_type {};
+
+template <class NODE>
+struct node_is_csr<NODE, std::void_t<decltype(NODE::csr_num)>> : std::true_type {};
+
+template <class NODE>
+constexpr bool node_is_csr_v = node_is_csr<NODE>::value;
+
+/* Type of the masks and values of the whole register, registers wider than 32 bits use 64-bit masks
+ *  REG::regwidth is the width of the register on the bus, registers without it are at most 32 bits.
+ */
+template <class REG, class = void>
+struct reg_word { using type = uint32_t; };
+
+template <class REG>
+struct reg_word<REG, std::void_t<decltype(REG::regwidth)>> {
+    using type = typename std::conditional<(REG::regwidth > 32), uint64_t, uint32_t>::type;
+};
+
+template <class REG>
+using reg_word_t = typename reg_word<REG>::type;
+
+/* Bits covered by the software writable fields of a register, emitted by the generator as sw_wr_mask.
+ *  Registers without it are considered fully covered by their fields.
+ */
+template <class REG, class = void>
+struct reg_sw_wr_mask : std::integral_constant<uint64_t, ~0ull> {};
+
+template <class REG>
+struct reg_sw_wr_mask<REG, std::void_t<decltype(REG::sw_wr_mask)>>
+    : std::integral_constant<uint64_t, REG::sw_wr_mask> {};
+
+/* Bits of the fields with a write side effect (onwrite, singlepulse), emitted as wr_noop_mask.
+ *  Writing wr_noop_val to them has no effect, they are never written back with the value read.
+ */
+template <class REG, class = void>
+struct reg_wr_noop_mask : std::integral_constant<uint64_t, 0u> {};
+
+template <class REG>
+struct reg_wr_noop_mask<REG, std::void_t<decltype(REG::wr_noop_mask)>>
+    : std::integral_constant<uint64_t, REG::wr_noop_mask> {};
+
+template <class REG, class = void>
+struct reg_wr_noop_val : std::integral_constant<uint64_t, 0u> {};
+
+template <class REG>
+struct reg_wr_noop_val<REG, std::void_t<decltype(REG::wr_noop_val)>>
+    : std::integral_constant<uint64_t, REG::wr_noop_val> {};
+
+/* Bus access of the type T with the IO class, with its read<T>() and write<T>() methods
+ *  IO classes that only implement read32() and write32(), like ArchIoNode overrides written
+ *  for previous versions, are accessed with 32-bit accesses, and two of them for 64-bit types.
+ */
+template <class IO, typename T, class = void>
+struct io_has_width : std::false_type {};
+
+template <class IO, typename T>
+struct io_has_width<IO, T, std::void_t<decltype(IO::template read<T>(0u))>> : std::true_type {};
+
+template <class IO, typename T>
+inline T io_read(uint32_t addr) {
+    if constexpr (io_has_width<IO, T>::value)
+        return IO::template read<T>(addr);
+    else if constexpr (sizeof(T) <= 4)
+        return static_cast<T>(IO::read32(addr));
+    else
+        return static_cast<T>(IO::read32(addr)) | (static_cast<T>(IO::read32(addr + 4)) << 32);
+}
+
+template <class IO, typename T>
+inline void io_write(uint32_t addr, T val) {
+    if constexpr (io_has_width<IO, T>::value) {
+        IO::template write<T>(addr, val);
+    } else if constexpr (sizeof(T) <= 4) {
+        IO::write32(addr, val);
+    } else {
+        IO::write32(addr, static_cast<uint32_t>(val));
+        IO::write32(addr + 4, static_cast<uint32_t>(val >> 32));
+    }
+}
+
+
+/* Block of n consecutive T, with the read_block<T>() and write_block<T>() methods of the IO class
+ *  IO classes can implement them to move buffers with a DMA, otherwise the block is accessed element by element.
+ */
+template <class IO, typename T, class = void>
+struct io_has_block : std::false_type {};
+
+template <class IO, typename T>
+struct io_has_block<IO, T, std::void_t<decltype(IO::template read_block<T>(0u, static_cast<T *>(nullptr), 0u))>> : std::true_type {};
+
+template <class IO, typename T>
+inline void io_read_block(uint32_t addr, T *dst, uint32_t n) {
+    if constexpr (io_has_block<IO, T>::value) {
+        IO::template read_block<T>(addr, dst, n);
+    } else {
+        for (uint32_t i = 0; i < n; i++)
+            dst[i] = io_read<IO, T>(addr + i * sizeof(T));
+    }
+}
+
+template <class IO, typename T>
+inline void io_write_block(uint32_t addr, const T *src, uint32_t n) {
+    if constexpr (io_has_block<IO, T>::value) {
+        IO::template write_block<T>(addr, src, n);
+    } else {
+        for (uint32_t i = 0; i < n; i++)
+            io_write<IO, T>(addr + i * sizeof(T), src[i]);
+    }
+}
+
+/* Accesses at addr, relative to the PARENT node, passed to the parent, or directly to the IO class
+ *  at their absolute address when the parent is exported with flat addresses.
+ */
+template <class PARENT, typename T>
+inline T parent_read(uint32_t addr) {
+    if constexpr (node_is_flat_v<PARENT>)
+        return io_read<typename PARENT::io_type, T>(PARENT::abs_base + addr);
+    else
+        return PARENT::template get<T>(addr);
+}
+
+template <class PARENT, typename T>
+inline void parent_write(uint32_t addr, T val) {
+    if constexpr (node_is_flat_v<PARENT>)
+        io_write<typename PARENT::io_type, T>(PARENT::abs_base + addr, val);
+    else
+        PARENT::template set<T>(addr, val);
+}
+
+template <class PARENT, typename T>
+inline void parent_read_block(uint32_t addr, T *dst, uint32_t n) {
+    if constexpr (node_is_flat_v<PARENT>)
+        io_read_block<typename PARENT::io_type, T>(PARENT::abs_base + addr, dst, n);
+    else
+        PARENT::template get_block<T>(addr, dst, n);
+}
+
+template <class PARENT, typename T>
+inline void parent_write_block(uint32_t addr, const T *src, uint32_t n) {
+    if constexpr (node_is_flat_v<PARENT>)
+        io_write_block<typename PARENT::io_type, T>(PARENT::abs_base + addr, src, n);
+    else
+        PARENT::template set_block<T>(addr, src, n);
+}
+
 }
 
 #endif // !_HALCPP_UTILS_H_
@@ -0,0 +1,204 @@
+#ifndef _HOST_IO_H_
+#define _HOST_IO_H_
+
+#include <cstdint>
+#include <cstring>
+#include <array>
+#include <unordered_map>
+#include <vector>
+#include "halcpp_utils.h"
+
+/* IO backends to run the generated HAL on the host, passed as IO_TYPE of the top addrmap:
+ *      using soc_t = SOC_HAL<0x0, void, halcpp::TraceIoNode<halcpp::SparseIoNode<>>>;
+ *  The default backend of the top addrmap is ArchIoNode, memory mapped IO of arch_io.h.
+ */
+
+namespace halcpp {
+
+/* Sparse memory model of the device, the bytes that were never written read as 0
+ *  The memory is allocated by pages of 4kB on the first access. TAG gives separate
+ *  memories to the top addrmaps that use different TAG types.
+ */
+template <typename TAG = void>
+class SparseIoNode {
+public:
+    template <typename T>
+    static inline T read(uint32_t addr) {
+        T val;
+        copy(addr, reinterpret_cast<uint8_t *>(&val), sizeof(T), false);
+        return val;
+    }
+
+    template <typename T>
+    static inline void write(uint32_t addr, T val) {
+        copy(addr, reinterpret_cast<uint8_t *>(&val), sizeof(T), true);
+    }
+
+    static inline uint32_t read32(uint32_t addr) { return read<uint32_t>(addr); }
+    static inline void write32(uint32_t addr, uint32_t val) { write<uint32_t>(addr, val); }
+
+    // Forget all the written values
+    static inline void reset() { pages.clear(); }
+
+private:
+    static constexpr uint32_t page_size = 4096;
+    using page_type = std::array<uint8_t, page_size>;
+
+    static inline std::unordered_map<uint32_t, page_type> pages;
+
+    static inline void copy(uint32_t addr, uint8_t *buf, uint32_t n, bool write) {
+        for (uint32_t i = 0; i < n; i++, addr++) {
+            auto it = pages.try_emplace(addr / page_size, page_type{}).first;
+            if (write)
+                it->second[addr % page_size] = buf[i];
+            else
+                buf[i] = it->second[addr % page_size];
+        }
+    }
+};
+
+/* Bus transaction recorded by TraceIoNode */
+struct Transaction {
+    uint32_t addr;
+    uint8_t size;       // Bytes
+    bool write;
+    uint64_t val;
+
+    bool operator==(const Transaction &other) const {
+        return addr == other.addr && size == other.size && write == other.write && val == other.val;
+    }
+};
+
+/* Records the transactions of the IO_TYPE backend, to count the bus accesses of driver operations
+ *      TRACE::clear();
+ *      soc.uart.CTRL.EN = 1;
+ *      assert(TRACE::reads() == 1 && TRACE::writes() == 1);
+ *  Blocks are recorded element by element, the same as IO backends without read_block() and write_block().
+ */
+template <typename IO_TYPE = SparseIoNode<>>
+class TraceIoNode {
+public:
+    template <typename T>
+    static inline T read(uint32_t addr) {
+        T val = io_read<IO_TYPE, T>(addr);
+        record(addr, sizeof(T), false, val);
+        return val;
+    }
+
+    template <typename T>
+    static inline void write(uint32_t addr, T val) {
+        record(addr, sizeof(T), true, val);
+        io_write<IO_TYPE, T>(addr, val);
+    }
+
+    static inline uint32_t read32(uint32_t addr) { return read<uint32_t>(addr); }
+    static inline void write32(uint32_t addr, uint32_t val) { write<uint32_t>(addr, val); }
+
+    static inline const std::vector<Transaction> &transactions() { return log; }
+    static inline uint32_t reads() { return n_reads; }
+    static inline uint32_t writes() { return n_writes; }
+
+    // Keep only the counts of the transactions, not the transactions themselves
+    static inline void set_recording(bool on) { recording = on; }
+
+    static inline void clear() {
+        log.clear();
+        n_reads = 0;
+        n_writes = 0;
+    }
+
+private:
+    static inline std::vector<Transaction> log;
+    static inline uint32_t n_reads = 0;
+    static inline uint32_t n_writes = 0;
+    static inline bool recording = true;
+
+    static inline void record(uint32_t addr, uint8_t size, bool write, uint64_t val) {
+        if (write)
+            n_writes++;
+        else
+            n_reads++;
+        if (recording)
+            log.push_back(Transaction{addr, size, write, val});
+    }
+};
+
+/* CSR instruction recorded by CsrFileMock, op is 'r' for csrr, 'w' for csrw, 's' for csrs and 'c' for csrc */
+struct CsrOp {
+    char op;
+    uint16_t csr;
+    uint64_t val;
+
+    bool operator==(const CsrOp &other) const {
+        return op == other.op && csr == other.csr && val == other.val;
+    }
+};
+
+/* Mock CSR file, that the Zicsr instructions of the CSR registers are routed to on the host
+ *  The instructions are macros of csr_reg_node.h, that this header defines when it is included
+ *  before the HAL. The CSRs read as 0 until written, count() and ops() give the executed instructions:
+ *      CsrFileMock::clear();
+ *      core.csr.MSTATUS.MIE = 1;
+ *      assert(CsrFileMock::count('s') == 1 && CsrFileMock::ops().size() == 1);
+ */
+class CsrFileMock {
+public:
+    static inline uint64_t csrr(uint32_t csr) {
+        record('r', csr, regs[csr]);
+        return regs[csr];
+    }
+
+    static inline void csrw(uint32_t csr, uint64_t val) {
+        record('w', csr, val);
+        regs[csr] = val;
+    }
+
+    static inline void csrs(uint32_t csr, uint64_t bits) {
+        record('s', csr, bits);
+        regs[csr] |= bits;
+    }
+
+    static inline void csrc(uint32_t csr, uint64_t bits) {
+        record('c', csr, bits);
+        regs[csr] &= ~bits;
+    }
+
+    // Value of a CSR, without recording an instruction
+    static inline uint64_t &reg(uint32_t csr) { return regs[csr]; }
+
+    static inline const std::vector<CsrOp> &ops() { return log; }
+
+    static inline uint32_t count(char op) {
+        uint32_t n = 0;
+        for (const CsrOp &o : log)
+            n += o.op == op;
+        return n;
+    }
+
+    static inline void clear() { log.clear(); }
+
+    // Clear the CSRs and the recorded instructions
+    static inline void reset() {
+        regs.fill(0);
+        log.clear();
+    }
+
+private:
+    static inline std::array<uint64_t, 4096> regs{};
+    static inline std::vector<CsrOp> log;
+
+    static inline void record(char op, uint32_t csr, uint64_t val) {
+        log.push_back(CsrOp{op, static_cast<uint16_t>(csr), val});
+    }
+};
+
+}
+
+#ifndef HALCPP_CSRR
+#define HALCPP_CSRR(csr, val) ((val) = halcpp::CsrFileMock::csrr(csr))
+#define HALCPP_CSRW(csr, val) halcpp::CsrFileMock::csrw(csr, val)
+#define HALCPP_CSRS(csr, val) halcpp::CsrFileMock::csrs(csr, val)
+#define HALCPP_CSRC(csr, val) halcpp::CsrFileMock::csrc(csr, val)
+#endif
+
+#endif // !_HOST_IO_H_
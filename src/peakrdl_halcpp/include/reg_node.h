@@ -3,26 +3,74 @@
 
 #include <stdint.h>
 #include <type_traits>
+#include <tuple>
 #include "halcpp_utils.h"
 
 namespace halcpp{
 
-template <uint32_t BASE, uint32_t WIDTH, typename PARENT_TYPE>
+/* REGWIDTH is the width of the register on the bus, by default the smallest integer type holding WIDTH bits.
+ *  It is accessed with ACCESSWIDTH wide accesses, several of them at increasing addresses if it is narrower.
+ */
+template <uint32_t BASE, uint32_t WIDTH, typename PARENT_TYPE, uint32_t REGWIDTH = 0, uint32_t ACCESSWIDTH = REGWIDTH>
 class RegBase {
 public:
+    static constexpr uint32_t regwidth = REGWIDTH != 0 ? REGWIDTH : 8 * sizeof(uint_t<WIDTH>);
+    static constexpr uint32_t accesswidth = ACCESSWIDTH != 0 ? ACCESSWIDTH : regwidth;
 
-    static constexpr uint32_t get_abs_addr() { return PARENT_TYPE().get_abs_addr() + BASE; }
+    static constexpr uint32_t get_abs_addr() {
+        if constexpr (node_is_flat_v<PARENT_TYPE>)
+            return PARENT_TYPE::abs_base + BASE;
+        else
+            return PARENT_TYPE().get_abs_addr() + BASE;
+    }
 
 protected:
+    static_assert(WIDTH <= regwidth && regwidth <= 64, "Register cannot be bigger than 64 bits");
+    static_assert(regwidth % accesswidth == 0, "Register width must be a multiple of its access width");
+
     static constexpr uint32_t width = WIDTH;
     static constexpr uint32_t rel_base = BASE;
     using parent_type = PARENT_TYPE;
-    using dataType =
-        typename std::conditional<WIDTH <= 8, uint8_t,
-                                  typename std::conditional<WIDTH <= 16,
-                                                            uint16_t, uint32_t>::type>::type;
+    using dataType = uint_t<WIDTH>;
+    using wordType = uint_t<regwidth>;
+    using accessType = uint_t<accesswidth>;
+
+public:
+    /* Bus accesses of the register at addr, relative to the parent, with the access width of the register
+     *  The register accesses rel_base, register arrays access their elements at runtime computed addresses.
+     */
+    static inline wordType bus_read(const uint32_t addr) {
+        if constexpr (sizeof(accessType) == sizeof(wordType)) {
+            return parent_read<PARENT_TYPE, wordType>(addr);
+        } else {
+            wordType val = 0;
+            for (uint32_t i = 0; i < sizeof(wordType) / sizeof(accessType); i++)
+                val |= static_cast<wordType>(parent_read<PARENT_TYPE, accessType>(addr + i * sizeof(accessType))) << (i * accesswidth);
+            return val;
+        }
+    }
+
+    static inline void bus_write(const uint32_t addr, wordType val) {
+        if constexpr (sizeof(accessType) == sizeof(wordType)) {
+            parent_write<PARENT_TYPE, wordType>(addr, val);
+        } else {
+            for (uint32_t i = 0; i < sizeof(wordType) / sizeof(accessType); i++)
+                parent_write<PARENT_TYPE, accessType>(addr + i * sizeof(accessType), static_cast<accessType>(val >> (i * accesswidth)));
+        }
+    }
 };
 
+template <uint64_t... MASKS>
+constexpr bool masks_disjoint() {
+    uint64_t acc = 0;
+    for (uint64_t m : {MASKS...}) {
+        if (acc & m)
+            return false;
+        acc |= m;
+    }
+    return true;
+}
+
 template<typename BASE_TYPE>
 class RegWrMixin : public BASE_TYPE {
 public:
@@ -30,18 +78,141 @@ public:
     static constexpr bool has_set() { return true; };
 
     static inline void set(typename BASE_TYPE::dataType val) {
-        parent::set(BASE_TYPE::rel_base, val);
+        BASE_TYPE::bus_write(BASE_TYPE::rel_base, val);
     }
 
     template<uint32_t CONST_WIDTH, uint32_t CONST_VAL>
     static inline void set(const Const<CONST_WIDTH, CONST_VAL> &a){
         static_assert(BASE_TYPE::width == CONST_WIDTH, "You need to provide all the bits for concatenation.");
-        parent::set(BASE_TYPE::rel_base, a.val);
+        set(a.val);
     }
+
+    /* Write several fields in a single bus transaction
+     *  reg.modify(reg.FIELD0(1), reg.FIELD2(mode_e::RUN));
+     *  The register is read once and written once, or only written if the given fields
+     *  cover all the writable bits, the register cannot be read or has a shadow.
+     *  CSRs are not read, the fields are cleared with csrc, then set with csrs, each only if it changes bits.
+     *  Fields with write side effects are not written back, they are given their no-op value.
+     */
+    template <typename... FIELD_VALS>
+    static inline void modify(const FIELD_VALS &... vals) {
+        static_assert(sizeof...(FIELD_VALS) > 0, "Provide at least one field value");
+        using reg_type = typename std::tuple_element<0, std::tuple<FIELD_VALS...>>::type::parent_type;
+        static_assert((std::is_same_v<reg_type, typename FIELD_VALS::parent_type> && ...),
+                      "All the fields must belong to the same register");
+        static_assert(std::is_base_of_v<RegWrMixin, reg_type>, "Fields do not belong to this register");
+        static_assert(masks_disjoint<FIELD_VALS::mask...>(), "A field is given more than once");
+
+        using word = reg_word_t<reg_type>;
+        constexpr word mask = (FIELD_VALS::mask | ...);
+        constexpr word keep_mask = reg_sw_wr_mask<reg_type>::value & ~reg_wr_noop_mask<reg_type>::value & ~mask;
+        constexpr word noop_val = reg_wr_noop_val<reg_type>::value & ~mask;
+        const word val = (vals.val | ...) | noop_val;
+
+        if constexpr (keep_mask == 0)
+            reg_type::set(val);
+        else if constexpr (node_is_csr_v<reg_type> && reg_wr_noop_mask<reg_type>::value == 0) {
+            if ((mask & ~val) != 0) reg_type::clear_bits(mask & ~val);
+            if (val != 0) reg_type::set_bits(val);
+        }
+        else if constexpr (node_has_shadow_v<reg_type>)
+            reg_type::set((reg_type::get_shadow() & keep_mask) | val);
+        else if constexpr (node_has_get_v<reg_type>)
+            reg_type::set((reg_type::get() & keep_mask) | val);
+        else
+            reg_type::set(val);
+    }
+
     // Dont bother with operator= equal as its going to be overriden by inherited class anyways
 
 };
 
+/* Register value read once from the bus
+ *  The generated registers extend it with an accessor per readable field,
+ *  the fields are then extracted from the captured value without any further bus access.
+ */
+template <uint32_t WIDTH>
+class RegValue {
+public:
+    using dataType = uint_t<WIDTH>;
+
+    constexpr explicit RegValue(dataType val) : val(val) {}
+
+    constexpr dataType get() const { return val; }
+    constexpr operator dataType() const { return val; }
+
+    template <uint32_t START_BIT, uint32_t END_BIT>
+    constexpr auto get_field() const {
+        constexpr uint32_t width = END_BIT - START_BIT + 1;
+        constexpr uint64_t mask = width >= 64 ? ~0ull : ((1ull << width) - 1);
+        return static_cast<uint_t<width>>((val >> START_BIT) & mask);
+    }
+
+protected:
+    dataType val;
+};
+
+/* Write mixin keeping a RAM mirror of the register value
+ *  Writes update the mirror, field writes and modify() take the other fields from
+ *  the mirror instead of reading the register, so they are a single bus write.
+ *  A readable register is read into the mirror by the first write after an invalidate(),
+ *  the mirror of a write-only register starts at the RESET value.
+ */
+template<typename BASE_TYPE, uint64_t RESET, bool READABLE>
+class RegShadowMixin : public RegWrMixin<BASE_TYPE> {
+private:
+    using parent = typename BASE_TYPE::parent_type;
+    using dataType = typename BASE_TYPE::dataType;
+
+    static inline dataType shadow = RESET;
+    static inline bool valid = !READABLE;
+
+public:
+    static constexpr bool has_shadow() { return true; };
+
+    static inline void set(dataType val) {
+        shadow = val;
+        valid = true;
+        RegWrMixin<BASE_TYPE>::set(val);
+    }
+
+    template<uint32_t CONST_WIDTH, uint32_t CONST_VAL>
+    static inline void set(const Const<CONST_WIDTH, CONST_VAL> &a){
+        static_assert(BASE_TYPE::width == CONST_WIDTH, "You need to provide all the bits for concatenation.");
+        set((dataType) a.val);
+    }
+
+    static inline dataType get_shadow() {
+        if constexpr (READABLE) {
+            if (!valid)
+                sync();
+        }
+        return shadow;
+    }
+
+    // Readable register: reload the mirror from the register, write-only register: write the mirror to the register
+    static inline void sync() {
+        if constexpr (READABLE) {
+            shadow = BASE_TYPE::bus_read(BASE_TYPE::rel_base);
+            valid = true;
+        } else {
+            RegWrMixin<BASE_TYPE>::set(shadow);
+        }
+    }
+
+    // Apply a write to the set or clear alias of the register, that bypassed the mirror
+    static inline void shadow_set_bits(dataType bits) { shadow |= bits; }
+    static inline void shadow_clear_bits(dataType bits) { shadow &= ~bits; }
+
+    // Readable register: reload the mirror on the next write, write-only register: reset the mirror to RESET
+    static inline void invalidate() {
+        if constexpr (READABLE)
+            valid = false;
+        else
+            shadow = RESET;
+    }
+};
+
 template <typename BASE_TYPE>
 class RegRdMixin : public BASE_TYPE {
 private:
@@ -51,7 +222,7 @@ public:
     static constexpr bool has_get() { return true; };
 
     static typename BASE_TYPE::dataType get() {
-        return parent::get(BASE_TYPE::rel_base);
+        return BASE_TYPE::bus_read(BASE_TYPE::rel_base);
     }
 
     template <typename T>
@@ -86,15 +257,20 @@ public:
     }
 };
 
-template <uint32_t BASE, uint32_t WIDTH, typename PARENT_TYPE>
-using RegRO = RegNode<RegRdMixin< RegBase< BASE, WIDTH, PARENT_TYPE> > >;
+template <uint32_t BASE, uint32_t WIDTH, typename PARENT_TYPE, uint32_t REGWIDTH = 0, uint32_t ACCESSWIDTH = REGWIDTH>
+using RegRO = RegNode<RegRdMixin< RegBase< BASE, WIDTH, PARENT_TYPE, REGWIDTH, ACCESSWIDTH> > >;
+
+template <uint32_t BASE, uint32_t WIDTH, typename PARENT_TYPE, uint32_t REGWIDTH = 0, uint32_t ACCESSWIDTH = REGWIDTH>
+using RegWO = RegNode<RegWrMixin< RegBase< BASE, WIDTH, PARENT_TYPE, REGWIDTH, ACCESSWIDTH> > >;
 
-template <uint32_t BASE, uint32_t WIDTH, typename PARENT_TYPE>
-using RegWO = RegNode<RegWrMixin< RegBase< BASE, WIDTH, PARENT_TYPE> > >;
+template <uint32_t BASE, uint32_t WIDTH, typename PARENT_TYPE, uint32_t REGWIDTH = 0, uint32_t ACCESSWIDTH = REGWIDTH>
+using RegRW = RegNode<RegWrMixin< RegBase< BASE, WIDTH, PARENT_TYPE, REGWIDTH, ACCESSWIDTH> >, RegRdMixin< RegBase< BASE, WIDTH, PARENT_TYPE, REGWIDTH, ACCESSWIDTH> >  >;
 
-template <uint32_t BASE, uint32_t WIDTH, typename PARENT_TYPE>
-using RegRW = RegNode<RegWrMixin< RegBase< BASE, WIDTH, PARENT_TYPE> >, RegRdMixin< RegBase< BASE, WIDTH, PARENT_TYPE> >  >;
+template <uint32_t BASE, uint32_t WIDTH, typename PARENT_TYPE, uint64_t RESET, uint32_t REGWIDTH = 0, uint32_t ACCESSWIDTH = REGWIDTH>
+using RegShadowWO = RegNode<RegShadowMixin< RegBase< BASE, WIDTH, PARENT_TYPE, REGWIDTH, ACCESSWIDTH>, RESET, false> >;
 
+template <uint32_t BASE, uint32_t WIDTH, typename PARENT_TYPE, uint64_t RESET, uint32_t REGWIDTH = 0, uint32_t ACCESSWIDTH = REGWIDTH>
+using RegShadowRW = RegNode<RegShadowMixin< RegBase< BASE, WIDTH, PARENT_TYPE, REGWIDTH, ACCESSWIDTH>, RESET, true>, RegRdMixin< RegBase< BASE, WIDTH, PARENT_TYPE, REGWIDTH, ACCESSWIDTH> >  >;
 }
 
 #endif // !_REG_NODE_H_
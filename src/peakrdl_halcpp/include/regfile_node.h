@@ -11,9 +11,21 @@ class RegfileNode {
 public:
     static constexpr uint32_t get_abs_addr() { return PARENT_TYPE().get_abs_addr() + BASE; }
 
-    static inline uint32_t get(const uint32_t addr) { return PARENT_TYPE::get(addr + BASE); }
-    static inline void set(const uint32_t addr, uint32_t val) {
-        PARENT_TYPE::set(addr + BASE, val);
+    template <typename T = uint32_t>
+    static inline T get(const uint32_t addr) { return PARENT_TYPE::template get<T>(addr + BASE); }
+    template <typename T = uint32_t>
+    static inline void set(const uint32_t addr, T val) {
+        PARENT_TYPE::template set<T>(addr + BASE, val);
+    }
+
+    // Block of n consecutive T at addr
+    template <typename T>
+    static inline void get_block(const uint32_t addr, T *dst, uint32_t n) {
+        PARENT_TYPE::template get_block<T>(addr + BASE, dst, n);
+    }
+    template <typename T>
+    static inline void set_block(const uint32_t addr, const T *src, uint32_t n) {
+        PARENT_TYPE::template set_block<T>(addr + BASE, src, n);
     }
 };
 